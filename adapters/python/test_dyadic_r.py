@@ -0,0 +1,6 @@
+#!/bin/env python
+
+from segintbench.dyadic_inter import calculate_intersections_dyadic
+from segintbench.run import *
+
+main(bin2float, calculate_intersections_dyadic)
@@ -0,0 +1,5 @@
+#!/bin/env python
+
+from segintbench.run import *
+
+main(bin2float, calculate_intersections_filtered)
@@ -0,0 +1,20 @@
+#!/bin/env python
+
+from segintbench.fast_inter import IntersectionType
+from segintbench.grid_inter import calculate_intersections_grid, count_intersections_grid
+from segintbench.run import *
+
+
+def postprocess(inp):
+    out = []
+    for i in inp:
+        if i[0] == IntersectionType.SEGMENT_OVERLAP:
+            out.append(i[3])
+            out.append(i[4])
+        else:
+            out.append(i[3])
+    return out
+
+
+main(lambda x: Fraction(bin2float(x)), calculate_intersections_grid, postprocess,
+     count_intersections=count_intersections_grid)
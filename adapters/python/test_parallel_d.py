@@ -0,0 +1,21 @@
+#!/bin/env python
+
+from segintbench.fast_inter import IntersectionType
+from segintbench.parallel_inter import calculate_intersections_parallel, count_intersections_parallel
+from segintbench.run import *
+
+
+def postprocess(inp):
+    out = []
+    for i in inp:
+        if i[0] == IntersectionType.SEGMENT_OVERLAP:
+            out.append((float2bin(i[3][0]), float2bin(i[3][1])))
+            out.append((float2bin(i[4][0]), float2bin(i[4][1])))
+        else:
+            out.append((float2bin(i[3][0]), float2bin(i[3][1])))
+    return out
+
+
+main(bin2float, calculate_intersections_parallel, postprocess, count_intersections=count_intersections_parallel,
+     extra_args={('-j', '--jobs'): dict(type=int, default=None,
+                                        help='Number of worker processes (default: all cores)')})
@@ -11,7 +11,7 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 
 
 def postprocess(intersections):
-    return list(itertools.chain.from_iterable(starmap(Point, inters[1:-1])) for inters in intersections.values())
+    return list(itertools.chain.from_iterable(starmap(Point, inters[1:-1]) for inters in intersections.values()))
 
 
 isector = SweepIntersector()
@@ -0,0 +1,8 @@
+#!/bin/env python
+
+from functools import partial
+
+from segintbench.run import *
+from segintbench.sweep_inter import calculate_intersections_sweep
+
+main(bin2float, partial(calculate_intersections_sweep, conv=float))
@@ -0,0 +1,6 @@
+#!/bin/env python
+
+from segintbench.run import *
+from segintbench.sweep_inter import calculate_intersections_sweep
+
+main(lambda x: Fraction(bin2float(x)), calculate_intersections_sweep)
@@ -1,6 +1,6 @@
 #!/bin/env python
 
-from segintbench.fast_inter import calculate_intersections_vectorized, IntersectionType
+from segintbench.fast_inter import IntersectionType, calculate_intersections_vectorized, count_intersections_vectorized
 from segintbench.run import *
 
 
@@ -15,4 +15,4 @@ def postprocess(inp):
     return out
 
 
-main(bin2float, calculate_intersections_vectorized, postprocess)
+main(bin2float, calculate_intersections_vectorized, postprocess, count_intersections=count_intersections_vectorized)
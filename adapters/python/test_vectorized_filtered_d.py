@@ -0,0 +1,21 @@
+#!/bin/env python
+
+from functools import partial
+
+from segintbench.fast_inter import IntersectionType, calculate_intersections_vectorized, count_intersections_vectorized
+from segintbench.run import *
+
+
+def postprocess(inp):
+    out = []
+    for i in inp:
+        if i[0] == IntersectionType.SEGMENT_OVERLAP:
+            out.append((float2bin(i[3][0]), float2bin(i[3][1])))
+            out.append((float2bin(i[4][0]), float2bin(i[4][1])))
+        else:
+            out.append((float2bin(i[3][0]), float2bin(i[3][1])))
+    return out
+
+
+main(bin2float, partial(calculate_intersections_vectorized, filtered=True), postprocess,
+     count_intersections=partial(count_intersections_vectorized, filtered=True))
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from segintbench.utils import SegmentArray
+
+# A bundle holds many test cases in one file: a 32 byte header of magic, format version and the offset and length of
+# the JSON index at the end of the file. Each case is a raw (n,4) little-endian float64 block aligned to BLOCK_ALIGN.
+BUNDLE_SUFFIX = ".segbundle"
+BUNDLE_MAGIC = b"SEGBNDL\0"
+BUNDLE_VERSION = 1
+BLOCK_ALIGN = 64
+_BUNDLE_HEADER = struct.Struct("<8sH6xQQ")
+
+
+class BundleEntry(NamedTuple):
+    name: str
+    category: str
+    n: int
+    md5: str
+    offset: int
+
+    @property
+    def key(self):
+        return f"{self.category}/{self.name}" if self.category else self.name
+
+
+def split_bundle_spec(spec):
+    """Split a `bundle.segbundle#category/name` spec into the bundle path and case key, or return (spec, None)."""
+    path, sep, key = str(spec).partition("#")
+    if sep and path.endswith(BUNDLE_SUFFIX):
+        return Path(path), key
+    return spec, None
+
+
+class BundleWriter:
+    """Append test cases to a new bundle, the index is written on `close`. `add` may be called from several threads."""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write(bytes(_BUNDLE_HEADER.size))
+        self._lock = threading.Lock()
+        self.entries = []
+
+    def add(self, name, category, segments):
+        coords = np.ascontiguousarray(SegmentArray.from_segments(segments).coords(), dtype="<f8")
+        data = coords.tobytes()
+        md5 = hashlib.md5(data).hexdigest()
+        with self._lock:
+            pos = self._file.tell()
+            offset = pos + -pos % BLOCK_ALIGN
+            self._file.seek(offset)
+            self._file.write(data)
+            entry = BundleEntry(name, category, len(coords), md5, offset)
+            self.entries.append(entry)
+        return entry
+
+    def close(self):
+        index = json.dumps([e._asdict() for e in sorted(self.entries, key=lambda e: e.key)]).encode()
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(_BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, offset, len(index)))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Bundle:
+    """Random access to the cases of a bundle file, which is memory-mapped instead of read.
+
+    Cases are looked up by their `category/name` key and returned as `SegmentArray` views of the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _BUNDLE_HEADER.size:
+            raise IOError(f"Truncated bundle header in {path}.")
+        magic, version, offset, length = _BUNDLE_HEADER.unpack_from(self._mmap)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise IOError(f"Invalid bundle header {magic!r} version {version} in {path}.")
+        self.entries = {e.key: e for e in (BundleEntry(**e) for e in json.loads(self._mmap[offset:offset + length]))}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        entry = self.entries[key]
+        if entry.n == 0:
+            return SegmentArray()
+        return SegmentArray(np.frombuffer(self._mmap, dtype="<f8", count=4 * entry.n, offset=entry.offset))
+
+    def items(self):
+        for key in self.entries:
+            yield key, self[key]
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # cases are still in use, the mapping is released together with them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_bundle_case(spec):
+    """Read a single case given as `bundle.segbundle#category/name` spec."""
+    path, key = split_bundle_spec(spec)
+    bundle = Bundle(path)  # kept open by the returned view
+    if key not in bundle:
+        raise KeyError(f"No test case {key!r} in bundle {path}.")
+    return bundle[key]
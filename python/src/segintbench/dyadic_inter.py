@@ -0,0 +1,53 @@
+import itertools
+import math
+from fractions import Fraction
+
+from segintbench.utils import Point
+
+
+def to_integer_grid(segments):
+    """Scale all coordinates onto a common integer grid.
+
+    Every double is exactly m·2^e, so multiplying by the largest denominator of all coordinates (for general rationals
+    their lcm) maps them to Python ints without any rounding. Returns the list of scaled (x1, y1, x2, y2) tuples and the
+    common denominator.
+    """
+    ratios = [tuple(v.as_integer_ratio() for v in seg.coords()) for seg in segments]
+    denominator = math.lcm(*(den for seg in ratios for _, den in seg)) if ratios else 1
+    scaled = [tuple(num * (denominator // den) for num, den in seg) for seg in ratios]
+    return scaled, denominator
+
+
+def calculate_intersections_dyadic(segments):
+    """Exact pairwise intersections like `calculate_intersections_pairwise(segments, conv=Fraction)`.
+
+    Determinants are evaluated on the integer grid of `to_integer_grid` and `Fraction`s are only built for the
+    reported points, which are yielded in the same order and with the same values as by the `Fraction` path.
+    """
+    scaled, denominator = to_integer_grid(segments)
+    segs = [(x1, y1, x2, y2, x2 - x1, y2 - y1) for x1, y1, x2, y2 in scaled]
+
+    for (x1, y1, x2, y2, dx1, dy1), (x3, y3, x4, y4, dx2, dy2) in itertools.combinations(segs, 2):
+        dx3 = x1 - x3
+        dy3 = y1 - y3
+
+        det = (dx1 * dy2) - (dx2 * dy1)
+        det1 = (dx1 * dy3) - (dx3 * dy1)
+        det2 = (dx2 * dy3) - (dx3 * dy2)
+
+        if det == 0:
+            if det1 != 0 or det2 != 0:
+                continue
+            # same checks as find_collinear_intersections, the scaling preserves the order of all coordinates
+            p1, p2 = sorted([(x1, y1), (x2, y2)])
+            p3, p4 = sorted([(x3, y3), (x4, y4)])
+            if p2[0] < p3[0] or p4[0] < p1[0]:
+                continue
+            overlap_start = max(p1, p3)
+            overlap_end = min(p2, p4)
+            yield Point(Fraction(overlap_start[0], denominator), Fraction(overlap_start[1], denominator))
+            if overlap_start != overlap_end:
+                yield Point(Fraction(overlap_end[0], denominator), Fraction(overlap_end[1], denominator))
+        elif (det > 0 and 0 <= det1 <= det and 0 <= det2 <= det) or (det < 0 and 0 >= det1 >= det and 0 >= det2 >= det):
+            den = det * denominator
+            yield Point(Fraction(x1 * det + det2 * dx1, den), Fraction(y1 * det + det2 * dy1, den))
@@ -0,0 +1,144 @@
+import contextlib
+import decimal
+import functools
+import inspect
+import itertools
+import re
+from fractions import Fraction
+from typing import Callable, NamedTuple, Optional
+
+from segintbench.utils import bin2float, count_intersection_types, float2bin, intersection_points, reported_points
+
+
+class Engine(NamedTuple):
+    """The parts of a Python adapter script: `main(decode, calculate, postprocess, count_intersections=count)`.
+
+    `context` is entered around calculating in `count_points`, e.g. to set the precision of decimals. The segments are
+    decoded outside of it, once for all engines sharing `decode`, so decoding must not depend on the context.
+    """
+    name: str
+    decode: Callable
+    calculate: Callable
+    postprocess: Optional[Callable] = None
+    count: Optional[Callable] = None
+    context: Callable = contextlib.nullcontext
+
+
+def decode_fraction(x):
+    return Fraction(bin2float(x))
+
+
+def typed_points(intersections):
+    return list(intersection_points(intersections))
+
+
+def typed_points_bin(intersections):
+    return [(float2bin(x), float2bin(y)) for x, y in intersection_points(intersections)]
+
+
+def _pairwise(name, decode, **kwargs):
+    from segintbench.utils import calculate_intersections_pairwise
+    return Engine(name, decode, functools.partial(calculate_intersections_pairwise, **kwargs))
+
+
+def _filtered(name):
+    from segintbench.utils import calculate_intersections_filtered
+    return Engine(name, bin2float, calculate_intersections_filtered)
+
+
+def _vectorized(name, decode, postprocess, **kwargs):
+    from segintbench.fast_inter import calculate_intersections_vectorized, count_intersections_vectorized
+    return Engine(name, decode, functools.partial(calculate_intersections_vectorized, **kwargs), postprocess,
+                  functools.partial(count_intersections_vectorized, **kwargs))
+
+
+def _grid(name, decode, postprocess):
+    from segintbench.grid_inter import calculate_intersections_grid, count_intersections_grid
+    return Engine(name, decode, calculate_intersections_grid, postprocess, count_intersections_grid)
+
+
+def _parallel(name):
+    from segintbench.parallel_inter import calculate_intersections_parallel, count_intersections_parallel
+    return Engine(name, bin2float, calculate_intersections_parallel, typed_points_bin, count_intersections_parallel)
+
+
+def _sweepline(name, decode, **kwargs):
+    from segintbench.sweep_inter import calculate_intersections_sweep
+    return Engine(name, decode, functools.partial(calculate_intersections_sweep, **kwargs))
+
+
+def _dyadic(name):
+    from segintbench.dyadic_inter import calculate_intersections_dyadic
+    return Engine(name, bin2float, calculate_intersections_dyadic)
+
+
+def _sweeper(name):
+    # third-party library shipped next to the adapters, see adapters/python/SweepIntersectorLib
+    import warnings
+    from SweepIntersectorLib.SweepIntersector import SweepIntersector
+    from segintbench.utils import Point
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    def postprocess(intersections):
+        return list(itertools.chain.from_iterable(
+            itertools.starmap(Point, inters[1:-1]) for inters in intersections.values()))
+
+    return Engine(name, bin2float, lambda segments: SweepIntersector().findIntersections(segments), postprocess)
+
+
+def _decimal(name, prec):
+    from segintbench.utils import calculate_intersections_pairwise
+    return Engine(name, lambda x: decimal.Decimal(bin2float(x)), calculate_intersections_pairwise,
+                  context=lambda: decimal.localcontext(decimal.Context(prec=prec)))
+
+
+# engine name to a factory, which only imports the engine (and its optional dependencies) when it is used
+ENGINES = {
+    "pairwise-double": functools.partial(_pairwise, "pairwise-double", bin2float, epsilon=1e-9),
+    "pairwise-fraction": functools.partial(_pairwise, "pairwise-fraction", decode_fraction),
+    "pairwise-filtered": functools.partial(_filtered, "pairwise-filtered"),
+    "vectorized-double": functools.partial(_vectorized, "vectorized-double", bin2float, typed_points_bin),
+    "vectorized-fraction": functools.partial(_vectorized, "vectorized-fraction", decode_fraction, typed_points),
+    "vectorized-filtered": functools.partial(_vectorized, "vectorized-filtered", bin2float, typed_points_bin,
+                                             filtered=True),
+    "grid-double": functools.partial(_grid, "grid-double", bin2float, typed_points_bin),
+    "grid-fraction": functools.partial(_grid, "grid-fraction", decode_fraction, typed_points),
+    "parallel-double": functools.partial(_parallel, "parallel-double"),
+    "sweepline-double": functools.partial(_sweepline, "sweepline-double", bin2float, conv=float),
+    "sweepline-fraction": functools.partial(_sweepline, "sweepline-fraction", decode_fraction),
+    "dyadic": functools.partial(_dyadic, "dyadic"),
+    "sweeper": functools.partial(_sweeper, "sweeper"),
+}
+DECIMAL_PRECISIONS = (5, 25, 50, 75, 100)  # the precisions of the decimal adapters, any other works as well
+
+
+def engine_names(decimals=True):
+    """Names of all registered engines, including `decimal-<prec>` for the precisions of the adapters."""
+    names = list(ENGINES)
+    if decimals:
+        names.extend(f"decimal-{prec}" for prec in DECIMAL_PRECISIONS)
+    return names
+
+
+def get_engine(name):
+    """Look up an engine by name, `decimal-<prec>` computes with decimals of any precision."""
+    if name in ENGINES:
+        return ENGINES[name]()
+    m = re.fullmatch(r"decimal-(\d+)", name)
+    if m:
+        return _decimal(name, int(m.group(1)))
+    raise KeyError(f"Unknown engine {name!r}, use one of {', '.join(engine_names())} or decimal-<prec>.")
+
+
+def count_points(engine, segments):
+    """Calculate the intersections of the decoded `segments` with `engine` and return their number, as reported by
+    `run.main` without `-a`."""
+    with engine.context():
+        if engine.count:
+            return reported_points(engine.count(segments))
+        intersections = engine.calculate(segments)
+        if inspect.isgenerator(intersections):
+            return reported_points(count_intersection_types(intersections))
+        if engine.postprocess:
+            intersections = engine.postprocess(intersections)
+        return len(intersections)
@@ -1,70 +1,369 @@
-from enum import Enum, auto
+import functools
+from collections import Counter
+from fractions import Fraction
+from typing import NamedTuple
 
+import numpy as np
 import pandas as pd
 
+from segintbench.utils import DET_ERRBOUND, MIN_FILTER_MAGNITUDE, IntersectionType, SegmentArray
 
-class IntersectionType(Enum):
-    TRUE_INTERSECTION = auto()
-    POINT_OVERLAP = auto()
-    SEGMENT_OVERLAP = auto()
+# pairs of segments are processed in blocks of TILE_SIZE x TILE_SIZE, bounding the size of temporary arrays
+TILE_SIZE = 256
 
 
-def find_collinear_intersections_vect(seg1p1, seg1p2, seg2p1, seg2p2):
-    if seg1p1 > seg1p2:
-        seg1p1, seg1p2 = seg1p2, seg1p1
-    if seg2p1 > seg2p2:
-        seg2p1, seg2p2 = seg2p2, seg2p1
+def ignore_overflow(func):
+    """Silence numpy's warnings about overflows and invalid values in `func`. Huge and non-finite coordinates overflow
+    in float arithmetic, which the kernels handle, so the warnings would only end up on the adapters' stderr."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with np.errstate(over="ignore", invalid="ignore"):
+            return func(*args, **kwargs)
+    return wrapper
 
-    if seg1p2[0] < seg2p1[0] or seg2p2[0] < seg1p1[0]:
-        return
 
-    overlap_start = max(seg1p1, seg2p1)
-    overlap_end = min(seg1p2, seg2p2)
+class IntersectionArrays(NamedTuple):
+    """Intersections of segment pairs as parallel arrays, one entry per intersecting pair.
 
-    if overlap_start == overlap_end:
-        yield IntersectionType.POINT_OVERLAP, (seg1p1, seg1p2), (seg2p1, seg2p2), overlap_start
-    else:
-        yield IntersectionType.SEGMENT_OVERLAP, (seg1p1, seg1p2), (seg2p1, seg2p2), overlap_start, overlap_end
+    `kind` holds `IntersectionType` values, `first` and `second` the indices of both segments and
+    `start` the (k,2) intersection points. `end` is the end of the overlap for `SEGMENT_OVERLAP`
+    entries and equal to `start` otherwise.
+    """
+    kind: np.ndarray
+    first: np.ndarray
+    second: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
 
+    @classmethod
+    def empty(cls, dtype=np.float64):
+        idx = np.empty(0, dtype=np.intp)
+        return cls(np.empty(0, dtype=np.int8), idx, idx, np.empty((0, 2), dtype=dtype), np.empty((0, 2), dtype=dtype))
 
-def find_intersections_vect(df1, df2):
-    df1 = df1.reset_index(drop=True)
-    df2 = df2.reset_index(drop=True)
-
-    dx1 = df1['x2'] - df1['x1']
-    dx2 = df2['x2'] - df2['x1']
-    dy1 = df1['y2'] - df1['y1']
-    dy2 = df2['y2'] - df2['y1']
-    dx3 = df1['x1'] - df2['x1']
-    dy3 = df1['y1'] - df2['y1']
-
-    ddf = pd.DataFrame({
-        'det': (dx1 * dy2) - (dx2 * dy1),
-        'det1': (dx1 * dy3) - (dx3 * dy1),
-        'det2': (dx2 * dy3) - (dx3 * dy2)
-    })
-    sel1 = ((ddf['det'] >= 0) & (0 <= ddf['det1']) & (ddf['det1'] <= ddf['det']) & (0 <= ddf['det2']) & (
-            ddf['det2'] <= ddf['det']))
-    sel2 = ((ddf['det'] < 0) & (0 >= ddf['det1']) & (ddf['det1'] >= ddf['det']) & (0 >= ddf['det2']) & (
-            ddf['det2'] >= ddf['det']))
-    for index, row in ddf[sel1 | sel2].iterrows():
-        seg1 = (df1['x1'][index], df1['y1'][index]), (df1['x2'][index], df1['y2'][index])
-        seg2 = (df2['x1'][index], df2['y1'][index]), (df2['x2'][index], df2['y2'][index])
-        if row['det'] == 0:
-            yield from find_collinear_intersections_vect(*seg1, *seg2)
-        else:
-            t = row['det2'] / row['det']
-            p = df1['x1'][index] + t * dx1[index], df1['y1'][index] + t * dy1[index]
-            if t == 0 or t == 1 or row['det1'] == 0 or row['det1'] == row['det']:
-                yield IntersectionType.POINT_OVERLAP, seg1, seg2, p
+    @classmethod
+    def concatenate(cls, parts, dtype=np.float64):
+        parts = [p for p in parts if len(p.kind)]
+        if not parts:
+            return cls.empty(dtype)
+        return cls(*(np.concatenate(col) for col in zip(*parts)))
+
+    def type_counts(self):
+        """Number of intersections per `IntersectionType`."""
+        return Counter({IntersectionType(k): n for k, n in enumerate(np.bincount(self.kind).tolist()) if n})
+
+    def to_tuples(self, coords, other=None):
+        """Yield the intersections in the tuple format of `calculate_intersections_vectorized`.
+
+        `first` indexes into the (n,4) array `coords`, `second` into `other` if given and `coords` otherwise.
+        """
+        segs1 = coords[self.first].tolist()
+        segs2 = (coords if other is None else other)[self.second].tolist()
+        for kind, (x1, y1, x2, y2), (x3, y3, x4, y4), start, end in zip(
+                self.kind.tolist(), segs1, segs2, self.start.tolist(), self.end.tolist()):
+            kind = IntersectionType(kind)
+            seg1, seg2 = ((x1, y1), (x2, y2)), ((x3, y3), (x4, y4))
+            if kind == IntersectionType.SEGMENT_OVERLAP:
+                yield kind, seg1, seg2, tuple(start), tuple(end)
             else:
-                yield IntersectionType.TRUE_INTERSECTION, seg1, seg2, p
+                yield kind, seg1, seg2, tuple(start)
 
 
-def calculate_intersections_vectorized(segments):
+def as_coords(segments):
+    """Return the segments as (n,4) array of x1, y1, x2, y2 rows without copying arrays and data frames."""
     if isinstance(segments, pd.DataFrame):
-        df = segments
+        return segments[["x1", "y1", "x2", "y2"]].to_numpy()
+    if isinstance(segments, np.ndarray):
+        return segments
+    if isinstance(segments, SegmentArray):
+        return segments.coords()
+    coords = np.array([s.coords() for s in segments]).reshape(-1, 4)
+    if coords.dtype.kind in "iub":
+        coords = coords.astype(object)  # keep exact python ints instead of overflowing int64
+    return coords
+
+
+def _lex_greater(ax, ay, bx, by):
+    return (ax > bx) | ((ax == bx) & (ay > by))
+
+
+def _collinear_overlaps(a, b):
+    x1, y1, x2, y2 = a.T
+    x3, y3, x4, y4 = b.T
+    # order the endpoints of each segment lexicographically
+    swap1 = _lex_greater(x1, y1, x2, y2)
+    s1x, s1y = np.where(swap1, x2, x1), np.where(swap1, y2, y1)
+    e1x, e1y = np.where(swap1, x1, x2), np.where(swap1, y1, y2)
+    swap2 = _lex_greater(x3, y3, x4, y4)
+    s2x, s2y = np.where(swap2, x4, x3), np.where(swap2, y4, y3)
+    e2x, e2y = np.where(swap2, x3, x4), np.where(swap2, y3, y4)
+
+    later_start = _lex_greater(s1x, s1y, s2x, s2y)
+    start = np.stack([np.where(later_start, s1x, s2x), np.where(later_start, s1y, s2y)], axis=1)
+    earlier_end = _lex_greater(e2x, e2y, e1x, e1y)
+    end = np.stack([np.where(earlier_end, e1x, e2x), np.where(earlier_end, e1y, e2y)], axis=1)
+
+    valid = ~_lex_greater(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+    point = (start[:, 0] == end[:, 0]) & (start[:, 1] == end[:, 1])
+    return valid, point, start, end
+
+
+def _determinants(x1, y1, x2, y2, x3, y3, x4, y4, magnitudes=False):
+    dx1 = x2 - x1
+    dx2 = x4 - x3
+    dy1 = y2 - y1
+    dy2 = y4 - y3
+    dx3 = x1 - x3
+    dy3 = y1 - y3
+
+    det = (dx1 * dy2) - (dx2 * dy1)
+    det1 = (dx1 * dy3) - (dx3 * dy1)
+    det2 = (dx2 * dy3) - (dx3 * dy2)
+    if not magnitudes:
+        return det, det1, det2
+    return (det, det1, det2,
+            np.abs(dx1 * dy2) + np.abs(dx2 * dy1), np.abs(dx1 * dy3) + np.abs(dx3 * dy1),
+            np.abs(dx2 * dy3) + np.abs(dx3 * dy2))
+
+
+def _selection(det, det1, det2):
+    sel1 = (det >= 0) & (0 <= det1) & (det1 <= det) & (0 <= det2) & (det2 <= det)
+    sel2 = (det < 0) & (0 >= det1) & (det1 >= det) & (0 >= det2) & (det2 >= det)
+    return sel1 | sel2
+
+
+def _filtered_selection(det, det1, det2, mag, mag1, mag2):
+    """Vectorized `utils.filtered_intersection`, returning the masks of certainly intersecting, certainly non-parallel
+    and of ambiguous pairs."""
+    err, err1, err2 = DET_ERRBOUND * mag, DET_ERRBOUND * mag1, DET_ERRBOUND * mag2
+    underflow = np.zeros(det.shape, dtype=bool)
+    for m in (mag, mag1, mag2):
+        underflow |= (0 < m) & (m < MIN_FILTER_MAGNITUDE)
+    sure = (np.abs(det) > err) & ~underflow
+
+    sign = np.where(det < 0, -1.0, 1.0)
+    det, det1, det2 = det * sign, det1 * sign, det2 * sign
+    # need 0 <= det1 <= det and 0 <= det2 <= det
+    bounds = ((det1, err1), (det - det1, 2 * (err + err1)), (det2, err2), (det - det2, 2 * (err + err2)))
+    outside = sure & np.logical_or.reduce([v < -e for v, e in bounds])
+    inside = sure & np.logical_and.reduce([v > e for v, e in bounds])
+    return inside, sure, ~inside & ~outside
+
+
+def _exact_rows(a, b):
+    """Like `intersect_rows`, but evaluated with `Fraction`s and returning float64 points."""
+    def exact(m):
+        return np.array([[Fraction(v) for v in row] for row in m.tolist()], dtype=object).reshape(-1, 4)
+
+    kind, rows, start, end = intersect_rows(exact(a), exact(b))
+    return kind, rows, start.astype(np.float64), end.astype(np.float64)
+
+
+def _sorted_by_row(kind, rows, start, end):
+    order = np.argsort(rows, kind="stable")
+    return kind[order], rows[order], start[order], end[order]
+
+
+def _classify(a, b, det, det1, det2):
+    """Compute kind, start and end for the intersecting rows of `a` and `b` given their (selected) determinants."""
+    collinear = det == 0
+    rows, crows = np.flatnonzero(~collinear), np.flatnonzero(collinear)
+
+    # regular crossings
+    x1, y1, x2, y2 = a[rows].T
+    det, det1, det2 = det[rows], det1[rows], det2[rows]
+    t = det2 / det
+    start = np.stack([x1 + t * (x2 - x1), y1 + t * (y2 - y1)], axis=1)
+    kind = np.where((t == 0) | (t == 1) | (det1 == 0) | (det1 == det),
+                    IntersectionType.POINT_OVERLAP.value, IntersectionType.TRUE_INTERSECTION.value).astype(np.int8)
+
+    # collinear sub-batch
+    valid, point, cstart, cend = _collinear_overlaps(a[crows], b[crows])
+    crows, point, cstart, cend = crows[valid], point[valid], cstart[valid], cend[valid]
+    ckind = np.where(point, IntersectionType.POINT_OVERLAP.value,
+                     IntersectionType.SEGMENT_OVERLAP.value).astype(np.int8)
+
+    return _sorted_by_row(np.concatenate([kind, ckind]), np.concatenate([rows, crows]),
+                          np.concatenate([start, cstart]), np.concatenate([start, cend]))
+
+
+def _shared_endpoints(a, b):
+    """Mask of the pairs sharing an endpoint and that endpoint (of the segments from `a`)."""
+    x1, y1, x2, y2 = np.moveaxis(a, -1, 0)
+    x3, y3, x4, y4 = np.moveaxis(b, -1, 0)
+    first = ((x1 == x3) & (y1 == y3)) | ((x1 == x4) & (y1 == y4))
+    second = ((x2 == x3) & (y2 == y3)) | ((x2 == x4) & (y2 == y4))
+    return first | second, first
+
+
+def _filtered_masks(a, b, det, det1, det2, mags, counters, upper=None):
+    """Masks of the certain intersections, certain touching pairs and ambiguous pairs of a float64 batch.
+
+    Non-parallel pairs sharing an endpoint touch exactly there. Pairs with non-finite coordinates are evaluated in
+    plain float arithmetic.
+    """
+    finite = np.isfinite(a).all(axis=-1) & np.isfinite(b).all(axis=-1)
+    sel, sure, ambiguous = _filtered_selection(det, det1, det2, *mags)
+    shared, _ = _shared_endpoints(a, b)
+    touching = shared & sure & finite
+    sel = np.where(finite, sel & ~touching, _selection(det, det1, det2))
+    ambiguous &= finite & ~touching
+    if upper is not None:
+        sel, touching, ambiguous, finite = sel & upper, touching & upper, ambiguous & upper, finite | ~upper
+    if counters is not None:
+        pairs = int(np.count_nonzero(upper)) if upper is not None else det.size
+        exact, unfiltered = int(np.count_nonzero(ambiguous)), int(np.count_nonzero(~finite))
+        counters.update(filtered=pairs - exact - unfiltered, exact=exact, unfiltered=unfiltered)
+    return sel, touching, ambiguous
+
+
+def _touching_rows(a, b):
+    """Kind, row, start and end of rows of non-parallel segments sharing an endpoint."""
+    _, first = _shared_endpoints(a, b)
+    start = np.where(first[:, None], a[:, 0:2], a[:, 2:4]) + 0.0  # adding 0.0 normalizes -0.0
+    kind = np.full(len(a), IntersectionType.POINT_OVERLAP.value, dtype=np.int8)
+    return kind, np.arange(len(a)), start, start
+
+
+@ignore_overflow
+def intersect_rows(a, b, filtered=False, counters=None):
+    """Intersect the segments in row i of `a` with those in row i of `b`, both given as (m,4) coordinate arrays.
+
+    Returns the `kind`, row index, `start` and `end` arrays of all intersecting rows in ascending row order.
+    Works for float64 as well as object arrays (e.g. of `Fraction`s). With `filtered`, float64 rows are decided
+    with filtered predicates and only ambiguous rows are evaluated exactly, see `utils.filtered_intersection`.
+    """
+    if not (filtered and a.dtype == np.float64 and b.dtype == np.float64):
+        det, det1, det2 = _determinants(*a.T, *b.T)
+        rows = np.flatnonzero(_selection(det, det1, det2))
+        kind, idx, start, end = _classify(a[rows], b[rows], det[rows], det1[rows], det2[rows])
+        return kind, rows[idx], start, end
+
+    det, det1, det2, *mags = _determinants(*a.T, *b.T, magnitudes=True)
+    sel, touching, ambiguous = _filtered_masks(a, b, det, det1, det2, mags, counters)
+    rows, trows, arows = np.flatnonzero(sel), np.flatnonzero(touching), np.flatnonzero(ambiguous)
+    parts = ((rows, _classify(a[rows], b[rows], det[rows], det1[rows], det2[rows])),
+             (trows, _touching_rows(a[trows], b[trows])), (arows, _exact_rows(a[arows], b[arows])))
+    kind, idx, start, end = zip(*((k, r[i], s, e) for r, (k, i, s, e) in parts))
+    return _sorted_by_row(*map(np.concatenate, (kind, idx, start, end)))
+
+
+def intersect_pairs(coords, first, second, filtered=False, counters=None):
+    """Intersect segment `first[i]` with segment `second[i]` of the (n,4) array `coords` for all i."""
+    kind, rows, start, end = intersect_rows(coords[first], coords[second], filtered, counters)
+    return IntersectionArrays(kind, first[rows], second[rows], start, end)
+
+
+def iter_tiles(n, tile_size=TILE_SIZE):
+    """Yield the (i0, i1, j0, j1) bounds of all tiles covering the upper triangle of the n×n pair matrix."""
+    for i0 in range(0, n, tile_size):
+        for j0 in range(i0, n, tile_size):
+            yield i0, min(i0 + tile_size, n), j0, min(j0 + tile_size, n)
+
+
+@ignore_overflow
+def intersect_tile(coords, i0, i1, j0, j1, filtered=False, counters=None):
+    """Intersect all pairs (i, j) with i0 <= i < i1, j0 <= j < j1 and i < j."""
+    a, b = coords[i0:i1], coords[j0:j1]
+    upper = np.triu(np.ones((i1 - i0, j1 - j0), dtype=bool), 1) if i0 == j0 else None
+    if filtered and coords.dtype == np.float64:
+        det, det1, det2, *mags = _determinants(*a.T[:, :, None], *b.T[:, None, :], magnitudes=True)
+        sel, touching, ambiguous = _filtered_masks(a[:, None, :], b[None, :, :], det, det1, det2, mags, counters,
+                                                   upper)
+    else:
+        det, det1, det2 = _determinants(*a.T[:, :, None], *b.T[:, None, :])
+        sel, touching, ambiguous = _selection(det, det1, det2), None, None
+        if upper is not None:
+            sel &= upper
+
+    ii, jj = np.nonzero(sel)
+    kind, idx, start, end = _classify(a[ii], b[jj], det[ii, jj], det1[ii, jj], det2[ii, jj])
+    parts = [IntersectionArrays(kind, ii[idx] + i0, jj[idx] + j0, start, end)]
+    for mask, evaluate in ((touching, _touching_rows), (ambiguous, _exact_rows)):
+        if mask is not None:
+            ii, jj = np.nonzero(mask)
+            kind, idx, start, end = evaluate(a[ii], b[jj])
+            parts.append(IntersectionArrays(kind, ii[idx] + i0, jj[idx] + j0, start, end))
+    return IntersectionArrays.concatenate(parts, dtype=coords.dtype)
+
+
+def iter_candidate_pairs(coords, chunk_size=TILE_SIZE * TILE_SIZE, counters=None):
+    """Yield (first, second) index arrays of all pairs with overlapping bounding boxes in chunks of about `chunk_size`.
+
+    Uses sort-and-sweep on the x-intervals. Boxes are compared in float64, which is conservative as rounding is
+    monotone. If a `collections.Counter` is given as `counters`, the number of "pairs", "candidates" and "pruned"
+    pairs is added to it.
+    """
+    n = len(coords)
+    x1, y1, x2, y2 = np.asarray(coords, dtype=np.float64).T
+    xmin, xmax = np.minimum(x1, x2), np.maximum(x1, x2)
+    ymin, ymax = np.minimum(y1, y2), np.maximum(y1, y2)
+
+    order = np.argsort(xmin, kind="stable")
+    xs = xmin[order]
+    # the boxes of order[p] and order[q], p < q, overlap in x iff q < hi[p]
+    hi = np.searchsorted(xs, xmax[order], side="right")
+    counts = np.maximum(hi - np.arange(n) - 1, 0)
+    ends = np.cumsum(counts)
+
+    candidates = 0
+    p0 = 0
+    while p0 < n:
+        p1 = max(int(np.searchsorted(ends, ends[p0] - counts[p0] + chunk_size, side="right")), p0 + 1)
+        cnt = counts[p0:p1]
+        p = np.repeat(np.arange(p0, p1), cnt)
+        q = p + 1 + np.arange(len(p)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        a, b = order[p], order[q]
+        keep = (ymin[a] <= ymax[b]) & (ymin[b] <= ymax[a])
+        a, b = a[keep], b[keep]
+        candidates += len(a)
+        yield np.minimum(a, b), np.maximum(a, b)
+        p0 = p1
+
+    if counters is not None:
+        pairs = n * (n - 1) // 2
+        counters.update(pairs=pairs, candidates=candidates, pruned=pairs - candidates)
+
+
+def calculate_intersections_arrays(segments, tile_size=TILE_SIZE, broad_phase=False, filtered=False, counters=None):
+    """Intersect all pairs of segments tile by tile, returning the result as `IntersectionArrays`.
+
+    With `broad_phase`, only the pairs with overlapping bounding boxes are passed to the exact test.
+    With `filtered`, float64 predicates are checked against an error bound and ambiguous pairs are evaluated exactly.
+    """
+    coords = as_coords(segments)
+    if broad_phase:
+        parts = (intersect_pairs(coords, first, second, filtered, counters) for first, second in
+                 iter_candidate_pairs(coords, tile_size * tile_size, counters))
+    else:
+        parts = (intersect_tile(coords, *tile, filtered, counters) for tile in iter_tiles(len(coords), tile_size))
+    return IntersectionArrays.concatenate(parts, dtype=coords.dtype)
+
+
+def find_intersections_vect(df1, df2):
+    a, b = as_coords(df1), as_coords(df2)
+    kind, rows, start, end = intersect_rows(a, b)
+    yield from IntersectionArrays(kind, rows, rows, start, end).to_tuples(a, b)
+
+
+def calculate_intersections_vectorized(segments, tile_size=TILE_SIZE, broad_phase=False, filtered=False,
+                                       counters=None):
+    coords = as_coords(segments)
+    if broad_phase:
+        for first, second in iter_candidate_pairs(coords, tile_size * tile_size, counters):
+            yield from intersect_pairs(coords, first, second, filtered, counters).to_tuples(coords)
+    else:
+        for tile in iter_tiles(len(coords), tile_size):
+            yield from intersect_tile(coords, *tile, filtered, counters).to_tuples(coords)
+
+
+def count_intersections_vectorized(segments, tile_size=TILE_SIZE, broad_phase=False, filtered=False, counters=None):
+    """Count the intersections of `calculate_intersections_vectorized` per `IntersectionType` without building them."""
+    coords = as_coords(segments)
+    counts = Counter()
+    if broad_phase:
+        for first, second in iter_candidate_pairs(coords, tile_size * tile_size, counters):
+            counts += intersect_pairs(coords, first, second, filtered, counters).type_counts()
     else:
-        df = pd.DataFrame((s.coords() for s in segments), columns=["x1", "y1", "x2", "y2"])
-    for i in range(1, len(df)):
-        yield from find_intersections_vect(df.iloc[:-i], df.iloc[i:])
+        for tile in iter_tiles(len(coords), tile_size):
+            counts += intersect_tile(coords, *tile, filtered, counters).type_counts()
+    return counts
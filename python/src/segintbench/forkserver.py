@@ -0,0 +1,137 @@
+import importlib
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from pathlib import Path
+
+from segintbench.scheduler import pin_to_cpu
+
+# modules imported once by the server, so that the forked adapter runs do not pay for them
+DEFAULT_PRELOAD = ("numpy", "psutil", "segintbench.run", "segintbench.fast_inter", "segintbench.grid_inter",
+                   "segintbench.parallel_inter")
+
+
+def is_python_command(command):
+    """Whether `command` runs a Python adapter script and can thus be run by the forkserver."""
+    parts = command.split(" ")
+    return len(parts) >= 2 and Path(parts[0]).name.startswith("python") and parts[1].endswith(".py")
+
+
+def serve(path, preload=DEFAULT_PRELOAD):
+    """Listen on the Unix socket `path` and run each submitted job in a freshly forked child of this process."""
+    for module in preload:
+        importlib.import_module(module)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # handlers exit on their own and are reaped automatically
+    print(f"Forkserver listening on {path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    _handle(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+    finally:
+        server.close()
+        os.unlink(path)
+
+
+def _handle(conn):
+    with conn, conn.makefile("rwb") as f:
+        job = json.loads(f.readline())
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            _run_job(job)
+        # wait for the job with a timeout, the process fd becomes readable once it exited
+        pidfd = os.pidfd_open(pid)
+        timed_out = not select.select([pidfd], [], [], job.get("timeout"))[0]
+        if timed_out:
+            os.kill(pid, signal.SIGKILL)
+        _, status, rusage = os.wait4(pid, 0)
+        os.close(pidfd)
+        exit_code = 124 if timed_out else os.waitstatus_to_exitcode(status)
+        if exit_code < 0:
+            exit_code = 128 - exit_code  # killed by a signal, as reported by a shell
+        f.write(json.dumps({
+            "exit_code": exit_code,
+            "elapsed": time.perf_counter() - start,
+            "user_time": rusage.ru_utime,
+            "system_time": rusage.ru_stime,
+            "max_rss_kb": rusage.ru_maxrss,
+        }).encode() + b"\n")
+
+
+def _run_job(job):
+    exit_code = 1
+    try:
+        os.chdir(job["cwd"])
+        pin_to_cpu(job.get("cpu"))
+        if job.get("memory_limit"):
+            resource.setrlimit(resource.RLIMIT_AS, (job["memory_limit"], job["memory_limit"]))
+        for fd, file, mode in ((0, os.devnull, os.O_RDONLY), (1, job["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+                               (2, job["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+            new = os.open(file, mode, 0o644)
+            os.dup2(new, fd)
+            os.close(new)
+        script = job["argv"][0]
+        sys.argv = list(job["argv"])
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        try:
+            runpy.run_path(script, run_name="__main__")
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+def submit(path, argv, *, cwd, stdout, stderr, timeout=None, memory_limit=None, cpu=None):
+    """Run the Python script `argv[0]` with arguments `argv[1:]` on the forkserver listening on `path`, writing its
+    output to the files `stdout` and `stderr`. Returns the exit code and resource usage of the run."""
+    job = {"argv": [str(a) for a in argv], "cwd": str(cwd), "stdout": str(stdout), "stderr": str(stderr),
+           "timeout": timeout, "memory_limit": memory_limit, "cpu": cpu}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(str(path))
+        with conn.makefile("rwb") as f:
+            f.write(json.dumps(job).encode() + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise RuntimeError(f"Forkserver {path} closed the connection without result for {argv}.")
+    return json.loads(line)
+
+
+def write_time_report(file, command, usage):
+    """Write the resource usage returned by `submit` in the format of GNU `time --verbose`, which is used for runs
+    outside the forkserver."""
+    minutes, seconds = divmod(usage["elapsed"], 60)
+    with open(file, "wt") as f:
+        f.write(f'\tCommand being timed: "{command}"\n'
+                f'\tUser time (seconds): {usage["user_time"]:.2f}\n'
+                f'\tSystem time (seconds): {usage["system_time"]:.2f}\n'
+                f'\tElapsed (wall clock) time (h:mm:ss or m:ss): {int(minutes)}:{seconds:05.2f}\n'
+                f'\tMaximum resident set size (kbytes): {usage["max_rss_kb"]}\n'
+                f'\tExit status: {usage["exit_code"]}\n')
@@ -0,0 +1,125 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+from segintbench.fast_inter import TILE_SIZE, IntersectionArrays, as_coords, ignore_overflow, intersect_pairs
+
+
+def _bounding_boxes(coords):
+    x1, y1, x2, y2 = np.asarray(coords, dtype=np.float64).T
+    return np.minimum(x1, x2), np.maximum(x1, x2), np.minimum(y1, y2), np.maximum(y1, y2)
+
+
+@ignore_overflow
+def _cell_ranges(boxes, resolution):
+    """Map the bounding boxes to inclusive cell index ranges (cx0, cx1, cy0, cy1) of a resolution×resolution grid."""
+    xmin, xmax, ymin, ymax = boxes
+
+    def axis(lo, hi):
+        finite = np.concatenate([lo[np.isfinite(lo)], hi[np.isfinite(hi)]])
+        origin, extent = (finite.min(), finite.max() - finite.min()) if len(finite) else (0.0, 0.0)
+        if not extent or not np.isfinite(extent):
+            extent = 1.0
+        scale = resolution / extent
+
+        def cell(v):
+            c = np.nan_to_num(np.floor((v - origin) * scale), nan=0.0)
+            return np.clip(c, 0, resolution - 1).astype(np.int64)
+
+        return cell(lo), cell(hi)
+
+    cx0, cx1 = axis(xmin, xmax)
+    cy0, cy1 = axis(ymin, ymax)
+    return cx0, cx1, cy0, cy1
+
+
+def grid_resolution(boxes):
+    """Pick the number of cells per axis, balancing the number of (segment, cell) entries against pairs per cell.
+
+    Candidates are powers of two up to twice sqrt(n), so that uniformly spread short segments end up with about one
+    segment per cell while long segments do not get replicated into too many cells.
+    """
+    n = len(boxes[0])
+    best, best_cost = 1, math.inf
+    g = 1
+    while g <= max(2 * math.isqrt(n), 1):
+        cx0, cx1, cy0, cy1 = _cell_ranges(boxes, g)
+        entries = float(((cx1 - cx0 + 1) * (cy1 - cy0 + 1)).sum())
+        cost = entries + entries * entries / (2 * g * g)
+        if cost < best_cost:
+            best, best_cost = g, cost
+        g *= 2
+    return best
+
+
+def iter_grid_pairs(coords, resolution=None, chunk_size=TILE_SIZE * TILE_SIZE, counters=None):
+    """Yield (first, second) index arrays of all pairs of segments that share a grid cell and overlap in their boxes.
+
+    A pair spanning several common cells is only reported for the cell containing the lower-left corner of the
+    intersection of both bounding boxes. If a `collections.Counter` is given as `counters`, the number of "pairs",
+    "candidates" and "pruned" pairs is added to it.
+    """
+    n = len(coords)
+    boxes = _bounding_boxes(coords)
+    xmin, xmax, ymin, ymax = boxes
+    if resolution is None:
+        resolution = grid_resolution(boxes)
+    cx0, cx1, cy0, cy1 = _cell_ranges(boxes, resolution)
+
+    # one entry per (segment, covered cell), sorted by cell
+    width, height = cx1 - cx0 + 1, cy1 - cy0 + 1
+    cover = width * height
+    seg = np.repeat(np.arange(n), cover)
+    offset = np.arange(len(seg)) - np.repeat(np.cumsum(cover) - cover, cover)
+    cx = cx0[seg] + offset % width[seg]
+    cy = cy0[seg] + offset // width[seg]
+    cell = cy * resolution + cx
+    order = np.argsort(cell, kind="stable")
+    seg, cx, cy, cell = seg[order], cx[order], cy[order], cell[order]
+
+    # entry k is paired with the following entries up to the end of its cell
+    group_end = np.searchsorted(cell, cell, side="right")
+    counts = group_end - np.arange(len(cell)) - 1
+    ends = np.cumsum(counts)
+
+    candidates = 0
+    k0 = 0
+    while k0 < len(cell):
+        k1 = max(int(np.searchsorted(ends, ends[k0] - counts[k0] + chunk_size, side="right")), k0 + 1)
+        cnt = counts[k0:k1]
+        k = np.repeat(np.arange(k0, k1), cnt)
+        m = k + 1 + np.arange(len(k)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        a, b = seg[k], seg[m]
+        keep = ((cx[k] == np.maximum(cx0[a], cx0[b])) & (cy[k] == np.maximum(cy0[a], cy0[b])) &
+                (xmin[a] <= xmax[b]) & (xmin[b] <= xmax[a]) & (ymin[a] <= ymax[b]) & (ymin[b] <= ymax[a]))
+        a, b = a[keep], b[keep]
+        candidates += len(a)
+        yield np.minimum(a, b), np.maximum(a, b)
+        k0 = k1
+
+    if counters is not None:
+        pairs = n * (n - 1) // 2
+        counters.update(pairs=pairs, candidates=candidates, pruned=pairs - candidates)
+
+
+def calculate_intersections_grid_arrays(segments, resolution=None, counters=None):
+    """Intersect all pairs of segments sharing a cell of a uniform grid, returning `IntersectionArrays`."""
+    coords = as_coords(segments)
+    return IntersectionArrays.concatenate(
+        (intersect_pairs(coords, first, second) for first, second in
+         iter_grid_pairs(coords, resolution, counters=counters)), dtype=coords.dtype)
+
+
+def calculate_intersections_grid(segments, resolution=None, counters=None):
+    coords = as_coords(segments)
+    for first, second in iter_grid_pairs(coords, resolution, counters=counters):
+        yield from intersect_pairs(coords, first, second).to_tuples(coords)
+
+
+def count_intersections_grid(segments, resolution=None, counters=None):
+    coords = as_coords(segments)
+    counts = Counter()
+    for first, second in iter_grid_pairs(coords, resolution, counters=counters):
+        counts += intersect_pairs(coords, first, second).type_counts()
+    return counts
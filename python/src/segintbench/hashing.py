@@ -0,0 +1,76 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# md5 is the default for compatibility with earlier results, sha1 is usually faster on CPUs with SHA extensions and
+# xxh3 (from the optional xxhash package) is much faster, but not cryptographic
+HASH_ALGORITHMS = ("md5", "sha1", "blake2b", "xxh3")
+DEFAULT_HASH_CACHE = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "segintbench" / "hashes.sqlite"
+CHUNK_SIZE = 1 << 20
+
+
+def new_hash(algorithm):
+    if algorithm == "xxh3":
+        import xxhash
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithm="md5"):
+    h = new_hash(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileHasher:
+    """Hash files in-process, caching the digests persistently in SQLite by (path, size, mtime_ns, inode).
+
+    Safe to use from several threads. `hashsum` returns the digest in the `md5sum` output format used by the meta data.
+    """
+
+    def __init__(self, algorithm="md5", cache=DEFAULT_HASH_CACHE):
+        self.algorithm = algorithm
+        new_hash(algorithm)  # fail early for unknown algorithms or a missing xxhash
+        self._lock = threading.Lock()
+        self._db = None
+        if cache:
+            Path(cache).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(cache, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT, algorithm TEXT, size INTEGER, "
+                             "mtime_ns INTEGER, inode INTEGER, digest TEXT, PRIMARY KEY (path, algorithm))")
+
+    def hexdigest(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        if self._db:
+            with self._lock:
+                row = self._db.execute("SELECT size, mtime_ns, inode, digest FROM hashes WHERE path=? AND algorithm=?",
+                                       (path, self.algorithm)).fetchone()
+            if row and tuple(row[:3]) == key:
+                return row[3]
+        digest = hash_file(path, self.algorithm)
+        if self._db:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                                 (path, self.algorithm, *key, digest))
+        return digest
+
+    def hashsum(self, path):
+        return f"{self.hexdigest(path)}  {path}"
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -63,5 +63,22 @@ def bin2float(input, output):
     write_segments_to_csv(list(read_segments_from_csv(input)), output, binary_encode=False)
 
 
+@cli.command()
+@click.argument('input', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output', type=click.Path(dir_okay=False))
+def csv2segb(input, output):
+    """Convert a bit-string CSV file into the binary .segb format."""
+    write_segments_to_segb(read_segment_array(input), output)
+
+
+@cli.command()
+@click.argument('input', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output', type=click.File('wt'))
+@click.option('--binary/--string', '-b/-s', is_flag=True, default=True)
+def segb2csv(input, output, binary):
+    """Convert a binary .segb file into a (bit-string) CSV file."""
+    write_segments_to_csv(read_segments_from_segb(input), output, binary_encode=binary)
+
+
 if __name__ == '__main__':
     cli()
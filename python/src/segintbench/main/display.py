@@ -1,8 +1,8 @@
 import argparse
-from fractions import Fraction
 
 import matplotlib.pyplot as plt
 
+from segintbench.dyadic_inter import calculate_intersections_dyadic
 from segintbench.utils import *
 
 
@@ -41,7 +41,7 @@ def main():
 
     # Calculate intersections
     if args.rational:
-        intersections = list(calculate_intersections_pairwise(segments, conv=Fraction))
+        intersections = list(calculate_intersections_dyadic(segments))
     else:
         intersections = list(calculate_intersections_pairwise(segments))
 
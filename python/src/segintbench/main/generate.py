@@ -1,10 +1,12 @@
 import concurrent
+import contextlib
 import functools
 import json
 from concurrent.futures import ThreadPoolExecutor
 
 from tqdm import tqdm
 
+from segintbench.bundle import BUNDLE_SUFFIX, BundleWriter
 from segintbench.testcases import CONFIGURATIONS
 from segintbench.utils import *
 
@@ -33,11 +35,17 @@ def random(output, count, min, max, int, binary, seed):
         for _ in range(count)], output, binary_encode=binary)
 
 
-def process_configuration(func, params, filename, category, *, output_dir, force, pb, seed):
+def process_configuration(func, params, filename, category, *, output_dir, force, pb, seed, compress, bundle):
     import random
     random.seed(seed)
     filepath = Path(output_dir) / category / filename
-    if filepath.is_file() and not force:
+    if compress:
+        filepath = filepath.with_name(f"{filepath.name}.{compress}")
+    if bundle:
+        pb.write(f"started: {category}/{filename}")
+        bundle.add(Path(filename).stem, category, func(*params))
+        pb.write(f"done: {category}/{filename}")
+    elif filepath.is_file() and not force:
         pb.write(f"skipped: {filepath}")
     else:
         pb.write(f"started: {category}/{filename}")
@@ -56,16 +64,22 @@ def process_configuration(func, params, filename, category, *, output_dir, force
 @click.option("--timeout", default=None, type=parse_timeout)
 @click.option("--parallelism", "-p", default=os.cpu_count() - 1)
 @click.option('--seed', default=None)
-def testcases(include, exclude, parallelism, timeout, **kwargs):
+@click.option("--compress", "-z", type=click.Choice([ext[1:] for ext in COMPRESSIONS]), default=None,
+              help="Write compressed .csv.gz/.csv.xz/.csv.bz2 files (not with --bundle)")
+@click.option("--bundle", "-b", default=None, type=click.Path(dir_okay=False, resolve_path=True),
+              help=f"Write all test cases into a single {BUNDLE_SUFFIX} file instead of the output directory")
+def testcases(include, exclude, parallelism, timeout, bundle, **kwargs):
+    if bundle and kwargs["compress"]:
+        raise click.UsageError("--compress cannot be combined with --bundle, whose blocks are read via mmap")
     incl_re = re.compile(include) if include else None
     excl_re = re.compile(exclude) if exclude else None
     configs = [c for c in CONFIGURATIONS if
                (not include or incl_re.match(f"{c[3]}/{c[2]}")) and (
                        not exclude or not excl_re.match(f"{c[3]}/{c[2]}"))]
 
-    with tqdm(total=len(configs)) as pb:
+    with tqdm(total=len(configs)) as pb, (BundleWriter(bundle) if bundle else contextlib.nullcontext()) as writer:
         with ThreadPoolExecutor(max_workers=parallelism or None) as ex:
-            fn = functools.partial(process_configuration, pb=pb, **kwargs)
+            fn = functools.partial(process_configuration, pb=pb, bundle=writer, **kwargs)
             fs = [ex.submit(fn, *config) for config in configs]
             while fs:
                 res = concurrent.futures.wait(fs, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
@@ -140,7 +154,9 @@ def geo_convert(input, output, binary):
     default='drive',
     help='Type of network to download (default: drive)')
 @click.option("--binary", default=True, is_flag=True)
-def locations(output_dir, network, binary):
+@click.option("--compress", "-z", type=click.Choice([ext[1:] for ext in COMPRESSIONS]), default=None,
+              help="Write compressed .csv.gz/.csv.xz/.csv.bz2 files")
+def locations(output_dir, network, binary, compress):
     os.makedirs(output_dir, exist_ok=True)
 
     cities = {
@@ -166,7 +182,7 @@ def locations(output_dir, network, binary):
             place = f"{district}, {city}"
             safe_name = place.replace(",", "").replace(" ", "_")
             output_geojson = os.path.join(output_dir, f"{safe_name}.geojson")
-            output_csv = os.path.join(output_dir, f"{safe_name}.csv")
+            output_csv = os.path.join(output_dir, f"{safe_name}.csv" + (f".{compress}" if compress else ""))
             download_street_network(place, network_type=network, output_path=output_geojson)
             segments = extract_segments_from_geojson(output_geojson)
             write_segments_to_csv(segments, output_csv, binary_encode=binary)
@@ -7,7 +7,11 @@ import getpass
 import json
 import pprint
 import resource
+import shutil
 import socket
+import statistics
+import tempfile
+import time
 import traceback
 from itertools import product
 from textwrap import indent
@@ -20,11 +24,21 @@ from json import JSONDecodeError
 from tqdm import tqdm
 from tqdm.contrib.concurrent import thread_map
 
-from segintbench.fast_inter import calculate_intersections_vectorized, IntersectionType
+from segintbench.bundle import BUNDLE_SUFFIX, Bundle, read_bundle_case, split_bundle_spec
+from segintbench.engines import count_points, engine_names, get_engine
+from segintbench.forkserver import DEFAULT_PRELOAD, is_python_command, serve, submit, write_time_report
+from segintbench.hashing import DEFAULT_HASH_CACHE, HASH_ALGORITHMS, FileHasher, hash_file
+from segintbench.results import ResultStore, is_result_store
+from segintbench.scheduler import pin_to_cpu, run_pinned, select_cpus
+from segintbench.stats import DEFAULT_STAT_CACHE, StatCache, segment_stats
 from segintbench.utils import *
 
 hostname = socket.gethostname()
 username = getpass.getuser()
+DEFAULT_CACHE_DIR = Path("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()) / "segintbench-cache"
+# size series following the `{name}_{a}_{b}` convention, e.g. star_intersections_4_s_1000 and random_int_l_2000 (but
+# not clustered_m_5, where the size is encoded in the letters and the number is the count of clusters)
+SERIES_PATTERN = r"(?!clustered_)(?P<series>.+_[sml])_(?P<size>\d+)"
 
 
 @click.group()
@@ -66,6 +80,8 @@ def print_adapters(adapters_dir, exclude_commands, only_commands):
 @click.argument("files", required=True, nargs=-1)
 @click.option("--exclude-files", "-e", default=None)
 @click.option("--print-intersections", "-a", is_flag=True)
+@click.option("--binary-output", "-B", is_flag=True,
+              help="Let the Python adapters write intersections in binary (with -a), all others print text")
 @click.option("--outdir", "-o", default=None, type=click.Path(file_okay=False, resolve_path=True))
 @click.option("--outstem", "-s", default=None)
 @click.option("--command", "-c", "commands", multiple=True)
@@ -79,11 +95,62 @@ def print_adapters(adapters_dir, exclude_commands, only_commands):
 @click.option("--timeout", "-t", default=None, type=parse_timeout)
 @click.option("--memory-limit", "-m", type=int, default=None,
               help="Maximum memory per test process (in MB)")
-def run(commands, files, parallelism, adapters_dir, exclude_files, exclude_commands, only_commands, **kwargs):
+@click.option("--repeat", type=int, default=None,
+              help="Let the Python adapters time this many runs on the parsed input and report the timings in "
+                   "nanoseconds, all others are timed once")
+@click.option("--warmup", type=int, default=0, help="Untimed runs before the --repeat runs of the Python adapters")
+@click.option("--memory-source", "memory_sources", multiple=True, type=click.Choice(MEMORY_SOURCES),
+              help="Let the Python adapters also measure the peak memory with this source in an untimed run")
+@click.option("--forkserver", default=None, type=click.Path(dir_okay=False),
+              help="Socket of a `forkserver` to run the Python adapters on, instead of starting a new interpreter")
+@click.option("--cache-dir", default=DEFAULT_CACHE_DIR, type=click.Path(file_okay=False, resolve_path=True),
+              help="Where compressed and bundled inputs are extracted to before running the adapters (default: tmpfs)")
+@click.option("--pin/--no-pin", default=True, help="Pin every run to its own cpu")
+@click.option("--reserve-siblings", is_flag=True, help="Leave the hyperthread siblings of the used cpus idle")
+@click.option("--isolated", is_flag=True,
+              help="Run the timed runs one at a time, other cpus only run those of --with-intersections")
+@click.option("--with-intersections", default=None, type=click.Path(file_okay=False, resolve_path=True),
+              help="Also run all adapters with -a, writing to this output directory")
+@click.option("--series/--no-series", default=True,
+              help="Run size series in ascending order and skip larger sizes after exceeding the time or memory limit")
+@click.option("--series-pattern", default=SERIES_PATTERN,
+              help="Regex with `series` and `size` groups matched against the input names")
+@click.option("--extrapolate", is_flag=True,
+              help="Also skip sizes of a series whose time, extrapolated from the smaller sizes, exceeds the timeout")
+@click.option("--hash", "hash_algorithm", type=click.Choice(HASH_ALGORITHMS), default="md5",
+              help="Hash of the inputs, adapters and outputs in the meta data (still stored as *_md5)")
+@click.option("--hash-cache", default=DEFAULT_HASH_CACHE, type=click.Path(dir_okay=False, resolve_path=True),
+              help="SQLite file caching the hashes of unchanged files")
+@click.option("--results-db", default=None, type=click.Path(dir_okay=False, resolve_path=True),
+              help="SQLite database to store the meta data of all runs in, instead of .meta.json files")
+def run(commands, files, parallelism, adapters_dir, exclude_files, exclude_commands, only_commands, cache_dir, pin,
+        reserve_siblings, isolated, with_intersections, series, series_pattern, extrapolate, hash_algorithm,
+        hash_cache, results_db, **kwargs):
     """Locally run one or more adapter on a given set of files"""
+    if kwargs["memory_sources"] and kwargs["print_intersections"]:
+        raise click.UsageError("--memory-source cannot be combined with -a")
     files = [f.absolute() for f in parse_files(files, "*.csv", exclude_files)]
+    results = kwargs["results"] = ResultStore(results_db) if results_db else None
+    try:
+        hasher = kwargs["hasher"] = FileHasher(hash_algorithm, hash_cache)
+    except ImportError as e:
+        raise click.UsageError(f"--hash {hash_algorithm} is not available: {e}")
+    # every case of a bundle is run separately, the md5 of its raw block in the bundle index is kept as well
+    kwargs["input_block_md5s"] = {}
+    for bundle_file in [f for f in files if f.suffix == BUNDLE_SUFFIX]:
+        files.remove(bundle_file)
+        with Bundle(bundle_file) as bundle:
+            for key, entry in bundle.entries.items():
+                spec = f"{bundle_file}#{key}"
+                if not exclude_files or not re.search(exclude_files, spec):
+                    files.append(spec)
+                    kwargs["input_block_md5s"][spec] = entry.md5
     if not kwargs.get("outstem", ""):
-        kwargs["outstem"] = Path(os.path.commonpath(Path(f).parent for f in files)).resolve()
+        kwargs["outstem"] = Path(os.path.commonpath(Path(split_bundle_spec(f)[0]).parent for f in files)).resolve()
+    extract = [f for f in files if split_bundle_spec(f)[1] is not None or Path(f).suffix in COMPRESSIONS]
+    kwargs["cached"] = dict(zip(extract, thread_map(
+        functools.partial(cache_input, cache_dir=Path(cache_dir), outstem=kwargs["outstem"]), extract,
+        desc="Extracting", max_workers=parallelism or None))) if extract else {}
     if not kwargs.get("outdir", ""):
         if kwargs.get("print_intersections", False):
             kwargs["outdir"] = Path("./out-intersections")
@@ -93,75 +160,310 @@ def run(commands, files, parallelism, adapters_dir, exclude_files, exclude_comma
     if not commands:
         commands = get_adapters(adapters_dir, exclude_commands, only_commands)
 
-    thread_map(functools.partial(test_one, **kwargs),
-               product(commands, files), total=len(commands) * len(files), max_workers=parallelism or None)
+    # hash every input and adapter once instead of in each run, bundle cases are hashed as extracted CSV
+    kwargs["input_md5s"] = dict(zip(files, thread_map(
+        lambda f: hasher.hashsum(kwargs["cached"][f] if split_bundle_spec(f)[1] is not None else f), files,
+        desc="Hashing", max_workers=parallelism or None)))
+    kwargs["command_md5s"] = {c: hasher.hashsum(get_command_file(c)) for c in commands}
+
+    # each run gets a cpu of its own, so that parallel runs interfere less with each others timings
+    cpus = select_cpus(parallelism, reserve_siblings) if pin else [None] * (parallelism or os.cpu_count())
+    ladders, singles = split_series(files, kwargs["outstem"], series_pattern) if series else ([], files)
+
+    def make_jobs(**kwargs):
+        return [functools.partial(test_series, job, extrapolate=extrapolate, **kwargs)
+                for job in product(commands, ladders)] + \
+            [functools.partial(test_one, job, **kwargs) for job in product(commands, singles)]
+
+    jobs = make_jobs(**kwargs)
+    accuracy_jobs = []
+    if with_intersections:
+        accuracy_jobs = make_jobs(**dict(kwargs, print_intersections=True, memory_sources=(),
+                                         outdir=Path(with_intersections)))
+    if isolated and not kwargs.get("print_intersections", False):
+        run_pinned(lambda job, cpu: job(cpu=cpu), accuracy_jobs, cpus, isolated=jobs)
+    else:
+        run_pinned(lambda job, cpu: job(cpu=cpu), jobs + accuracy_jobs, cpus)
+    hasher.close()
+    if results:
+        results.close()
+
+
+def input_name(file, outstem):
+    """Path of an input relative to `outstem`, without compression suffix and with bundle cases as `bundle/key.csv`."""
+    path, key = split_bundle_spec(file)
+    if key is not None:
+        return Path(path.stem) / f"{key}.csv"
+    return strip_compression(Path(file).relative_to(outstem))
+
+
+def cache_input(file, *, cache_dir, outstem):
+    """Decompress `file` or extract the bundle case once into `cache_dir` as plain CSV file, so that all adapters can
+    read it and are timed without the decompression."""
+    cached = cache_dir / input_name(file, outstem)
+    source, key = split_bundle_spec(file)
+    if not cached.is_file() or cached.stat().st_mtime_ns < Path(source).stat().st_mtime_ns:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_name(cached.name + ".tmp")
+        if key is not None:
+            write_segments_to_csv(read_bundle_case(file), tmp)
+        else:
+            with open_file(file, "rb") as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        tmp.replace(cached)
+    return cached
+
 
+def test_one(args, *, print_intersections, binary_output, force, retry_failed, timeout, outdir, outstem, memory_limit,
+             quiet, cached, input_md5s, input_block_md5s, command_md5s, hasher, repeat, warmup, memory_sources,
+             forkserver, results, cpu=None, skip=None):
+    """Run `command` on `file` and return its meta data, or only record the reason why the run was `skip`ped.
 
-def test_one(args, *, print_intersections, force, retry_failed, timeout, outdir, outstem, memory_limit, quiet):
+    The meta data is written to the `results` store if given, otherwise to a .meta.json file next to the output.
+    """
     command, file = args
     command_file = get_command_file(command)
-    basepath = Path(outdir).absolute() / command_file.name / Path(file).relative_to(outstem)
+    input_file = cached.get(file, file)
+    basepath = Path(outdir).absolute() / command_file.name / input_name(file, outstem)
     outpath = basepath.with_suffix(".out.csv")
     uniqpath = basepath.with_suffix(".uniq.csv")
     errpath = basepath.with_suffix(".err.txt")
     timepath = basepath.with_suffix(".time.txt")
     metapath = basepath.with_suffix(".meta.json")
-    if not force and outpath.exists() and metapath.exists() and (not retry_failed or not errpath.exists()):
+    resultpath = basepath.with_suffix(".result.json")
+    existing = None
+    if not force and results:
+        # the database alone decides which runs are resumed, runs that were skipped before never ran
+        existing = results.get(outpath)
+        if existing and (existing.get("skipped") or retry_failed and existing.get("exit_code") != 0):
+            existing = None
+    elif not force and outpath.exists() and (not retry_failed or not errpath.exists()) and metapath.exists():
+        with open(metapath, "rt") as f:
+            existing = json.load(f)
+    if existing:
         if not quiet:
-            tqdm.write(f"Skipping {file} as output {outpath} already exists")
-        return
+            tqdm.write(f"Skipping {file} as run for output {outpath} already exists")
+        return existing
     outpath.parent.mkdir(parents=True, exist_ok=True)
-    for p in (outpath, errpath, timepath, metapath, uniqpath):
+    for p in (outpath, errpath, timepath, metapath, uniqpath, resultpath):
         if p.exists():
             p.unlink()
 
-    comm = sh
-    comm = comm.time.bake(verbose=True, output=timepath, _cwd=outpath.parent).bake("--")
-    if memory_limit:
-        max_bytes = memory_limit * 1024 * 1024
-        comm = comm.bake(_preexec_fn=lambda: resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes)))
-    if timeout:
-        comm = comm.timeout.bake(kill_after=10).bake(timeout)
-    comm = comm.bake(*command.split(" "), _err=errpath, _out=outpath)  # _env={}
+    max_bytes = memory_limit and memory_limit * 1024 * 1024
+
+    def preexec():
+        pin_to_cpu(cpu)
+        if max_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+    # only the Python adapters can write binary output, time repeated runs and measure other memory sources, all
+    # others print text and run once
+    python = is_python_command(command)
+    binary_output = print_intersections and binary_output and python
+    if not python:
+        repeat, warmup, memory_sources = None, None, ()
+    adapter_args = []
     if print_intersections:
-        comm = comm.bake("-a")
+        adapter_args.append("-a")
+        if binary_output:
+            adapter_args.append("-b")
+    if repeat:
+        adapter_args.extend(["--repeat", repeat, "--warmup", warmup])
+    for source in memory_sources:
+        adapter_args.extend(["--memory-source", source])
+    forked = forkserver and python
 
     meta = {
         "starttime": datetime.datetime.now().isoformat(),
         "host": hostname,
         "user": username,
         "input": str(file),
+        "input_cache": str(input_file) if input_file != file else None,
         "command": command,
         "time": str(timepath),
         "output": str(outpath),
         "error": str(errpath),
-        "input_stat": tuple(Path(file).stat()),
+        "input_stat": tuple(Path(split_bundle_spec(file)[0]).stat()),
         "command_stat": tuple(command_file.stat()),
-        "input_md5": sh.md5sum(file).strip(),
-        "command_md5": sh.md5sum(command_file).strip(),
+        "input_md5": input_md5s.get(file) or hasher.hashsum(file),
+        "input_block_md5": input_block_md5s.get(file),
+        "command_md5": command_md5s.get(command) or hasher.hashsum(command_file),
+        "hash_algorithm": hasher.algorithm,
         "print_intersections": print_intersections,
+        "binary_output": binary_output,
+        "repeat": repeat,
+        "warmup": warmup,
+        "memory_sources": memory_sources,
+        "forkserver": str(forkserver) if forked else None,
+        "cpu": cpu,
         "force": force,
         "retry_failed": retry_failed,
         "timeout": timeout,
+        "memory_limit": memory_limit,
     }
 
-    try:
-        comm("-f", file)
-        exit_code = 0
-    except sh.ErrorReturnCode as e:
-        exit_code = e.exit_code
-        if not quiet:
-            tqdm.write(f"Command {command_file} failed on {file} with code {exit_code}, check {errpath} for details")
+    if skip:
+        meta["skipped"] = skip
+        meta["exit_code"] = None
+        save_meta(meta, metapath, results)
+        return meta
+
+    start_time = time.perf_counter()
+    if forked:
+        # same output files, but the adapter is forked from the pre-warmed server instead of started from scratch
+        argv = [*command.split(" ")[1:], *adapter_args, "-f", input_file]
+        usage = submit(forkserver, argv, cwd=outpath.parent, stdout=outpath, stderr=errpath, timeout=timeout,
+                       memory_limit=max_bytes, cpu=cpu)
+        write_time_report(timepath, command, usage)
+        exit_code = usage["exit_code"]
+    else:
+        # GNU time is only needed here, forked runs report their resource usage themselves
+        comm = sh.time.bake(verbose=True, output=timepath, _cwd=outpath.parent).bake("--")
+        if memory_limit or cpu is not None:
+            comm = comm.bake(_preexec_fn=preexec)
+        if timeout:
+            comm = comm.timeout.bake(kill_after=10).bake(timeout)
+        comm = comm.bake(*command.split(" "), *adapter_args, _err=errpath, _out=outpath)  # _env={}
+        try:
+            comm("-f", input_file)
+            exit_code = 0
+        except sh.ErrorReturnCode as e:
+            exit_code = e.exit_code
+    if exit_code != 0 and not quiet:
+        tqdm.write(f"Command {command_file} failed on {file} with code {exit_code}, check {errpath} for details")
 
     meta["exit_code"] = exit_code
     meta["endtime"] = datetime.datetime.now().isoformat()
+    meta["wall_time"] = time.perf_counter() - start_time
     meta["output_stat"] = tuple(outpath.stat())
-    meta["output_md5"] = sh.md5sum(outpath).strip()
-    with open(metapath, "w") as f:
-        json.dump(meta, f, indent=4)
+    meta["output_md5"] = hasher.hashsum(outpath)
+    save_meta(meta, metapath, results)
 
     if errpath.is_file() and errpath.stat().st_size == 0:
         errpath.unlink()
+    return meta
+
+
+def save_meta(meta, metapath, results=None):
+    if results:
+        results.put(meta)
+    else:
+        with open(metapath, "w") as f:
+            json.dump(meta, f, indent=4)
+
+
+def split_series(files, outstem, pattern=SERIES_PATTERN):
+    """Split `files` into size series, whose names match `pattern` with the same `series` group and a different `size`,
+    and single files. Series are returned as lists of (size, file) pairs by ascending size."""
+    series, singles = defaultdict(list), []
+    for file in files:
+        m = re.fullmatch(pattern, input_name(file, outstem).stem)
+        if m:
+            series[m.group("series")].append((int(m.group("size")), file))
+        else:
+            singles.append(file)
+    for key, sizes in list(series.items()):
+        if len(sizes) == 1:
+            singles.append(sizes[0][1])
+            del series[key]
+    return [sorted(sizes, key=lambda e: e[0]) for sizes in series.values()], singles
+
+
+def exceeded_limits(meta):
+    """Why a run exceeded the time or memory limit, or None."""
+    if meta.get("skipped"):
+        return meta["skipped"]
+    if meta.get("exit_code") in (124, 137):  # timeout or killed after it
+        return f"timeout on {meta['input']}"
+    if meta.get("exit_code") and meta.get("memory_limit") and Path(meta["error"]).is_file():
+        with open(meta["error"], "rt", errors="replace") as f:
+            if any(e in f.read() for e in ("MemoryError", "bad_alloc", "memory allocation")):
+                return f"memory limit on {meta['input']}"
+    return None
+
+
+def predict_time(runs, size):
+    """Extrapolate the wall time for `size` from the (size, time) pairs of the two largest completed runs, assuming
+    that the time grows polynomially."""
+    if len(runs) < 2:
+        return None
+    (n1, t1), (n2, t2) = runs[-2:]
+    if n1 == n2 or t1 <= 0 or t2 <= 0:
+        return None
+    exponent = math.log(t2 / t1) / math.log(n2 / n1)
+    return t2 * (size / n2) ** exponent
+
+
+def test_series(args, *, cpu=None, extrapolate=False, **kwargs):
+    """Run `command` on the (size, file) pairs of a size series in order and skip all sizes after one exceeding the time
+    or memory limit, or, with `extrapolate`, which is predicted to exceed the timeout."""
+    command, series = args
+    skip, runs = None, []
+    for size, file in series:
+        if not skip and extrapolate and kwargs["timeout"]:
+            predicted = predict_time(runs, size)
+            if predicted is not None and predicted > kwargs["timeout"]:
+                skip = f"predicted {predicted:.0f}s for {file}"
+        meta = test_one((command, file), cpu=cpu, skip=skip, **kwargs)
+        skip = skip or exceeded_limits(meta)
+        if meta.get("exit_code") == 0 and meta.get("wall_time"):
+            runs.append((size, meta["wall_time"]))
+
+
+@cli.command()
+@click.argument("files", required=True, nargs=-1)
+@click.argument("out", required=True, type=click.File(mode="w"))
+@click.option("--engine", "-E", "engines", multiple=True,
+              help="Registered engine to run, see segintbench.engines (default: all but the decimal ones)")
+@click.option("--exclude-files", "-e", default=None)
+@click.option("--repeat", type=int, default=3)
+@click.option("--warmup", type=int, default=1)
+@click.option("--adapters-dir", default=None, type=click.Path(exists=True, file_okay=False, resolve_path=True),
+              help="Where the third-party libraries of the Python adapters are found")
+def bench(files, out, engines, exclude_files, repeat, warmup, adapters_dir):
+    """Compare the throughput of the Python engines in-process, on inputs that are parsed once per decoding"""
+    sys.path.append(str(Path(adapters_dir or f"{__file__}/../../../../../adapters").resolve() / "python"))
+    loaded = []
+    for name in engines or engine_names(decimals=False):
+        try:
+            loaded.append(get_engine(name))
+        except ImportError as e:
+            tqdm.write(f"Skipping engine {name}: {e}", file=sys.stderr)
+    files = [f.absolute() for f in parse_files(files, "*.csv", exclude_files)]
+
+    w = csv.DictWriter(out, ["input", "engine", "segments", "result", "time_min_ns", "time_median_ns",
+                             "time_stdev_ns", "time_samples_ns"])
+    w.writeheader()
+    with tqdm(total=len(files) * len(loaded)) as pb:
+        for file in files:
+            parsed = {}  # engines sharing a decoding share the parsed segments
+            for engine in loaded:
+                if engine.decode not in parsed:
+                    parsed[engine.decode] = read_segments(file, decode=engine.decode)
+                segments = parsed[engine.decode]
+                for _ in range(warmup):
+                    count_points(engine, segments)
+                samples = []
+                for _ in range(repeat):
+                    start_time = time.perf_counter_ns()
+                    result = count_points(engine, segments)
+                    samples.append(time.perf_counter_ns() - start_time)
+                w.writerow({
+                    "input": str(file), "engine": engine.name, "segments": len(segments), "result": result,
+                    "time_min_ns": min(samples), "time_median_ns": int(statistics.median(samples)),
+                    "time_stdev_ns": int(statistics.stdev(samples)) if len(samples) > 1 else 0,
+                    "time_samples_ns": ";".join(map(str, samples)),
+                })
+                out.flush()
+                pb.update()
+
+
+@cli.command()
+@click.argument("socket_path", type=click.Path(dir_okay=False, resolve_path=True))
+@click.option("--preload", "-i", multiple=True, help="Additional modules to import before forking the adapters")
+def forkserver(socket_path, preload):
+    """Serve Python adapter runs for `run --forkserver SOCKET_PATH` from a pre-warmed process"""
+    serve(socket_path, DEFAULT_PRELOAD + preload)
 
 
 @cli.command()
@@ -169,12 +471,44 @@ def test_one(args, *, print_intersections, force, retry_failed, timeout, outdir,
 @click.argument("out", required=True, type=click.File(mode="w"))
 @click.option("--timeout", default=None, type=parse_timeout)
 @click.option("--parallelism", "-p", default=os.cpu_count() - 1)
-def stat(files, out, timeout, parallelism):
+@click.option("--force", "-f", is_flag=True, help="Compute the statistics again, even if they are cached")
+@click.option("--hash", "hash_algorithm", type=click.Choice(HASH_ALGORITHMS), default="md5",
+              help="Hash of the file contents the statistics are cached by")
+@click.option("--hash-cache", default=DEFAULT_HASH_CACHE, type=click.Path(dir_okay=False, resolve_path=True),
+              help="SQLite file caching the hashes of unchanged files")
+@click.option("--stat-cache", default=DEFAULT_STAT_CACHE, type=click.Path(dir_okay=False, resolve_path=True),
+              help="SQLite file caching the statistics of the files by their hash")
+def stat(files, out, timeout, parallelism, force, hash_algorithm, hash_cache, stat_cache):
+    """Compute statistics of the segments and their intersections for each test file"""
     files = list(parse_files(files, "*.csv"))
+    try:
+        hasher = FileHasher(hash_algorithm, hash_cache)
+    except ImportError as e:
+        raise click.UsageError(f"--hash {hash_algorithm} is not available: {e}")
+    digests = dict(zip(files, (f"{hash_algorithm}:{d}" for d in thread_map(
+        hasher.hexdigest, files, desc="Hashing", max_workers=parallelism or None))))
+    hasher.close()
+    cache = StatCache(stat_cache)
     w = None
-    with tqdm(total=len(files)) as pb:
+
+    def write(row):
+        nonlocal w
+        if not w:
+            w = csv.DictWriter(out, row.keys())
+            w.writeheader()
+        w.writerow(row)
+
+    pending = []
+    for file in files:
+        stats = None if force else cache.get(digests[file])
+        if stats:
+            write({"file": file, **stats})
+        else:
+            pending.append(file)
+
+    with tqdm(total=len(files), initial=len(files) - len(pending)) as pb:
         with ProcessPoolExecutor(max_workers=parallelism or None) as ex:
-            fs = [ex.submit(stat_one_file, f) for f in files]
+            fs = [ex.submit(stat_one_file, f) for f in pending]
             while fs:
                 res = concurrent.futures.wait(fs, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
                 if not res.done:
@@ -185,127 +519,200 @@ def stat(files, out, timeout, parallelism):
                     for future in res.done:
                         try:
                             row = future.result(0)  # This will raise an exception if the task failed
-                            if not w:
-                                w = csv.DictWriter(out, row.keys())
-                                w.writeheader()
-                            w.writerow(row)
+                            cache.put(digests[row["file"]], {k: v for k, v in row.items() if k != "file"})
+                            write(row)
                         except Exception as e:
                             print(f"An error occurred: {e}")
-                        pb.update(len(res.done))
+                    pb.update(len(res.done))
                     fs = res.not_done
+    cache.close()
 
 
 def stat_one_file(file):
-    # tqdm.write(f"start: {file}")
-    segs = list(read_segments_from_csv(file, decode=lambda x: Fraction(bin2float(x))))
-    n = len(segs)
-
-    length_0 = horiz = vert = 0
-    points = set()
-    for seg in segs:
-        if seg[0] == seg[1]:
-            length_0 += 1
-        elif seg[0][0] == seg[1][0]:
-            horiz += 1
-        elif seg[0][1] == seg[1][1]:
-            vert += 1
-        points.update(seg)
-
-    # same_x = length_0 or vert
-    # same_y = length_0 or horiz
-    # if not same_x:
-    same_x = (len(segs) * 2) - len(set(itertools.chain.from_iterable((s.p1.x, s.p2.x) for s in segs)))
-    # if not same_y:
-    same_y = (len(segs) * 2) - len(set(itertools.chain.from_iterable((s.p1.y, s.p2.y) for s in segs)))
-
-    overlap = online = intersect = 0
-    inter_points = set()
-    for e in calculate_intersections_vectorized(segs):
-        if e[0] == IntersectionType.SEGMENT_OVERLAP:
-            overlap += 1
-        elif e[0] == IntersectionType.POINT_OVERLAP:
-            online += 1
-        elif e[0] == IntersectionType.TRUE_INTERSECTION:
-            intersect += 1
-            inter_points.add(e[3])
-
-    # tqdm.write(f"done: {file}")
-    return {
-        "file": file, "segs": n, "combs": n * (n - 1) // 2,
-        "points": len(points), "intersection_points": len(inter_points),
-        "true_intersection_points": len(inter_points - points),
-        "length_0": length_0, "horiz": horiz, "vert": vert, "same_x": same_x, "same_y": same_y,
-        "same_p": (len(segs) * 2) - len(points),
-        "overlap": overlap, "online": online, "intersect": intersect,
-    }
+    """Statistics of the segments and their intersections in `file`, see `segintbench.stats`."""
+    return {"file": file, **segment_stats(read_segments(file))}
+
+
+# keys derived from the outputs by `collect`, besides the collected_at marker
+COLLECTED_KEYS = ["result", "result_uniq", "result_true", "result_point", "result_segment", "time", "memory",
+                  "time_min_ns", "time_median_ns", "time_stdev_ns", "time_samples_ns",
+                  *(f"memory_{source}" for source in MEMORY_SOURCES), "uniqfile", "uniqfile_stat", "uniqfile_md5"]
+
+
+def result_path(meta):
+    """The file next to the output of a run, which the results derived by `collect` are kept in."""
+    return Path(meta["output"]).with_suffix("").with_suffix(".result.json")
+
+
+def read_output(meta):
+    """Derive the results of a successful run from its output."""
+    res = {}
+    with open(meta["output"], "rb") as f:
+        if f.read(1) == b"{":
+            f.seek(0)
+            legacy = json.load(f)
+            if "command" in legacy:  # output overwritten with the collected meta data by earlier versions of collect
+                return {k: legacy.get(k) for k in COLLECTED_KEYS}
+    if meta.get("print_intersections", True):
+        if meta.get("binary_output", False):
+            width, rows = read_points_binary(meta["output"])
+            segs_count, segs = len(rows), unique_points_csv(width, rows)
+        else:
+            with open(meta["output"], "rt") as csvfile:
+                header = next(csvfile).strip()
+                if header != 'p_x;p_y':  # Skip the header line
+                    raise IOError(f"Invalid CSV header {header!r}.")
+                segs_count = 0
+                segs = set()
+                for row in csvfile.readlines():
+                    segs_count += 1
+                    segs.add(row)
+            segs = sorted(segs)
+        res["result_uniq"] = segs_count
+        res["result"] = len(segs)
+
+        uniqfile = Path(meta["output"]).with_suffix("").with_suffix(".uniq.csv")
+        with open(uniqfile, "wt") as csvfile:
+            csvfile.write("p_x;p_y\n")
+            csvfile.writelines(segs)
+        res["uniqfile"] = str(uniqfile)
+        res["uniqfile_stat"] = tuple(uniqfile.stat())
+        res["uniqfile_md5"] = hash_file(uniqfile, meta.get("hash_algorithm", "md5")) + f"  {uniqfile}"
+    elif meta.get("repeat", None) or meta.get("memory_sources", None):
+        with open(meta["output"], "rt") as f:
+            result = json.load(f)
+        timings = result["time_ns"]
+        res["result"], res["memory"] = result["result"], result["memory"]
+        res["time"] = timings["min"] // 1_000_000
+        res["time_min_ns"], res["time_median_ns"], res["time_stdev_ns"] = \
+            timings["min"], timings["median"], timings["stdev"]
+        res["time_samples_ns"] = ";".join(map(str, timings["samples"]))
+        if "counts" in result:
+            counts = result["counts"]
+            res["result_true"], res["result_point"], res["result_segment"] = \
+                counts["true_intersection"], counts["point_overlap"], counts["segment_overlap"]
+        for source, peak in result.get("memory_peak", {}).items():
+            res[f"memory_{source}"] = peak
+    else:
+        with open(meta["output"], "rt") as f:
+            lines = f.read().split()
+        res["result"], res["time"], res["memory"] = map(int, lines[:3])
+    return res
+
+
+def collect_one(run, force=False):
+    """Collect a run given as (meta data file, None) or (label, meta data) and return (label, meta, status, message).
+
+    The status is one of corrupt, skipped, failed, error, cached or collected. Runs are only read again if their output
+    changed since they were last collected, as recorded by the collected_from marker.
+    """
+    label, meta = run
+    stored = meta is not None  # the derived results of stored runs are kept in their database
+    if not stored:
+        try:
+            with open(label, "rt") as f:
+                meta = json.load(f)
+        except JSONDecodeError as e:
+            return label, None, "corrupt", f"Corrupt meta data {label}: {e}"
+    previous = {k: meta.pop(k, None) for k in (*COLLECTED_KEYS, "collected_at", "collected_from")}
+    for k in ["skipped", "endtime", "wall_time", "output_stat", "output_md5"]:  # not set for skipped runs
+        meta.setdefault(k, None)
+    meta.update(dict.fromkeys(COLLECTED_KEYS), collected_at=None, collected_from=None)
+
+    if meta["skipped"]:
+        return label, meta, "skipped", None
+    if meta.get("exit_code", None) != 0:
+        return label, meta, "failed", f"Failed run in {label} with exit code {meta.get('exit_code', None)}"
+    try:
+        st = os.stat(meta["output"])
+        source = [meta["endtime"], st.st_size, st.st_mtime_ns]
+        if not stored and not force:
+            try:
+                with open(result_path(meta), "rt") as f:
+                    previous = json.load(f)
+            except (OSError, JSONDecodeError):
+                previous = {}
+        if not force and previous.get("collected_from") == source:
+            meta.update((k, previous.get(k)) for k in (*COLLECTED_KEYS, "collected_at", "collected_from"))
+            return label, meta, "cached", None
+
+        meta.update(read_output(meta))
+        meta["collected_at"] = datetime.datetime.now().isoformat()
+        meta["collected_from"] = source
+        if not stored:
+            path = result_path(meta)
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wt") as f:
+                json.dump({k: meta[k] for k in (*COLLECTED_KEYS, "collected_at", "collected_from")}, f)
+            tmp.replace(path)
+        return label, meta, "collected", None
+    except Exception as e:
+        msg = '\n\t'.join(traceback.format_exception_only(e)).strip()
+        return label, meta, "error", f"Error reading output for {label}: {msg}"
 
 
 @cli.command()
 @click.argument("files", required=True, nargs=-1)
 @click.argument("out", required=True, type=click.File(mode="w"))
-def collect(files, out):
-    files = list(parse_files(files, "*.meta.json"))
-    w = None
-    errors = failed_runs = 0
+@click.option("--parallelism", "-p", default=os.cpu_count())
+@click.option("--force", "-f", is_flag=True, help="Also read the outputs of runs that were already collected")
+def collect(files, out, parallelism, force):
+    """Read the results from the outputs of all runs given by their meta data files or by `run --results-db`
+
+    The results are kept in a .result.json file next to each output, or in the database, and only read again once the
+    output changed.
+    """
+    runs, stores = [], []
+    for file in parse_files(files, "*.meta.json"):
+        if is_result_store(file):
+            store = ResultStore(file)
+            metas = store.query()
+            runs.extend((meta["output"], meta) for meta in metas)
+            stores.extend([store] * len(metas))
+        else:
+            runs.append((str(file), None))
+            stores.append(None)
+    collected = defaultdict(list)
+    rows = []
+    errors = failed_runs = skipped_runs = cached_runs = 0
     failed_cmds = collections.Counter()
     failed_files = collections.Counter()
-    for metafile in tqdm(files):
-        with open(metafile, "rt") as f:
-            try:
-                meta = json.load(f)
-            except JSONDecodeError as e:
-                tqdm.write(f"Corrupt meta data {metafile}: {e}", file=sys.stderr)
+    with ProcessPoolExecutor(max_workers=parallelism or None) as ex:
+        results = ex.map(functools.partial(collect_one, force=force), runs,
+                         chunksize=max(1, min(256, len(runs) // (4 * (parallelism or os.cpu_count())))))
+        for store, (label, meta, status, message) in tqdm(zip(stores, results), total=len(runs)):
+            if message:
+                tqdm.write(message, file=sys.stderr)
+            if status == "corrupt":
                 errors += 1
                 continue
-        for k in ["result", "result_uniq", "time", "memory", "uniqfile", "uniqfile_stat", "uniqfile_md5"]:
-            meta[k] = None
-
-        if meta.get("exit_code", None) != 0:
-            tqdm.write(f"Failed run in {metafile} with exit code {meta.get('exit_code', None)}", file=sys.stderr)
-            failed_runs += 1
-            failed_cmds[meta["command"]] += 1
-            failed_files[meta["input"]] += 1
-        elif meta.get("result", None) is None:
-            try:
-                if meta.get("print_intersections", True):
-                    with open(meta["output"], "rt") as csvfile:
-                        header = next(csvfile).strip()
-                        if header != 'p_x;p_y':  # Skip the header line
-                            raise IOError(f"Invalid CSV header {header!r}.")
-                        segs_count = 0
-                        segs = set()
-                        for row in csvfile.readlines():
-                            segs_count += 1
-                            segs.add(row)
-                    meta["result_uniq"] = segs_count
-                    meta["result"] = len(segs)
-
-                    uniqfile = Path(meta["output"]).with_suffix("").with_suffix(".uniq.csv")
-                    with open(uniqfile, "wt") as csvfile:
-                        csvfile.write("p_x;p_y\n")
-                        csvfile.writelines(sorted(segs))
-                    meta["uniqfile"] = str(uniqfile)
-                    meta["uniqfile_stat"] = tuple(uniqfile.stat())
-                    meta["uniqfile_md5"] = sh.md5sum(uniqfile).strip()
-                else:
-                    with open(meta["output"], "rt") as f:
-                        meta["result"], meta["time"], meta["memory"] = map(int, f.readlines())
-
-                with open(meta["output"], "wt") as f:
-                    json.dump(meta, f)
-
-            except Exception as e:
-                msg = '\n\t'.join(traceback.format_exception_only(e)).strip()
-                tqdm.write(f"Error reading output for {metafile}: {msg}", file=sys.stderr)
+            if status == "skipped":
+                skipped_runs += 1
+            elif status == "failed":
+                failed_runs += 1
+            elif status == "error":
                 errors += 1
+            elif status == "cached":
+                cached_runs += 1
+            elif store:
+                collected[store].append(meta)
+            if status in ("failed", "error"):
                 failed_cmds[meta["command"]] += 1
                 failed_files[meta["input"]] += 1
-
-        if not w:
-            w = csv.DictWriter(out, meta.keys())
-            w.writeheader()
-        w.writerow(meta)
-
+            rows.append(meta)
+
+    # runs of older versions or series have other keys, so the columns are those of all runs in the order first seen
+    w = csv.DictWriter(out, list(dict.fromkeys(k for row in rows for k in row)), restval="")
+    w.writeheader()
+    w.writerows(rows)
+
+    for store in set(filter(None, stores)):
+        store.put(*collected[store])
+        store.close()
+    if cached_runs != 0:
+        tqdm.write(f"Reused the results of {cached_runs} unchanged runs.", file=sys.stderr)
+    if skipped_runs != 0:
+        tqdm.write(f"Found {skipped_runs} runs skipped after smaller sizes exceeded the limits.", file=sys.stderr)
     if failed_runs != 0:
         tqdm.write(f"Found {failed_runs} failed runs!", file=sys.stderr)
         tqdm.write(f"Failures/errors per command:\n{pprint.pformat(failed_cmds)}", file=sys.stderr)
@@ -313,11 +720,11 @@ def collect(files, out):
     if errors != 0:
         raise click.ClickException(f"{errors} errors encountered while collecting results, see stderr for details")
     else:
-        tqdm.write(f"Successfully processed {len(files)} files!")
+        tqdm.write(f"Successfully processed {len(runs)} runs!")
 
 
 @cli.command()
-@click.argument("file", required=True, type=click.File('rt'))
+@click.argument("file", required=True, type=click.Path(exists=True, dir_okay=False, allow_dash=True))
 @click.argument("out", required=True, type=click.File('wt'))
 @click.option("--tablefmt", "-f", default="github")
 @click.option("--key", "-k", default="result")
@@ -331,18 +738,27 @@ def collect(files, out):
 @click.option("--stat-base", "-b", default="")
 def summarize(file, out, tablefmt, key, missing, exclude_files, only_files, exclude_commands, only_commands, reference,
               stat, stat_base):
+    """Tabulate the results of `collect`, from its CSV output or the database of `run --results-db`"""
+    if is_result_store(file):
+        with ResultStore(file) as results:
+            rows = results.query(only_files=only_files, exclude_files=exclude_files)
+    else:
+        with click.open_file(file, "rt") as f:
+            rows = list(csv.DictReader(f))
+
     if stat:
         stats = {stat_base + row["file"]: row for row in csv.DictReader(stat)}
     else:
         stats = {}
 
     summary = defaultdict(dict)
-    for row in csv.DictReader(file):
+    for row in rows:
         if exclude_files and re.search(exclude_files, row["input"]):
             continue
         if only_files and not re.search(only_files, row["input"]):
             continue
-        val = str(row[key])
+        val = row.get(key)
+        val = missing if val is None else str(val)  # runs from the database are not necessarily collected yet
         if key.endswith("_md5"):
             val = val.split(" ")[0]
         summary[row["input"]][row["command"]] = val
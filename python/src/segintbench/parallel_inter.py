@@ -0,0 +1,87 @@
+import collections
+import functools
+import itertools
+import os
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from segintbench.fast_inter import TILE_SIZE, IntersectionArrays, as_coords, intersect_tile, iter_tiles
+
+# set in each worker by _attach
+_shm = None
+_coords = None
+
+
+def _attach(name, shape):
+    global _shm, _coords
+    _shm = shared_memory.SharedMemory(name=name)
+    _coords = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+
+
+def _intersect_tiles(tiles, filtered, count=False):
+    counters = collections.Counter() if filtered else None
+    parts = (intersect_tile(_coords, *tile, filtered, counters) for tile in tiles)
+    if count:
+        return sum((part.type_counts() for part in parts), collections.Counter()), counters
+    return IntersectionArrays.concatenate(parts), counters
+
+
+def _batches(tiles, size):
+    tiles = iter(tiles)
+    while batch := list(itertools.islice(tiles, size)):
+        yield batch
+
+
+def _tile_results(coords, jobs, tile_size, filtered, counters, count):
+    """Yield the intersections of all tiles in tile order, computed by `jobs` processes, as `IntersectionArrays` or
+    only their type counts if `count`."""
+    tiles = iter_tiles(len(coords), tile_size)
+    if coords.dtype != np.float64 or jobs <= 1:
+        for tile in tiles:
+            part = intersect_tile(coords, *tile, filtered, counters)
+            yield part.type_counts() if count else part
+        return
+
+    tiles = list(tiles)
+    # a few batches per worker balance the load without sending every tile separately
+    batch_size = max(len(tiles) // (jobs * 8), 1)
+    shm = shared_memory.SharedMemory(create=True, size=max(coords.nbytes, 1))
+    try:
+        np.ndarray(coords.shape, dtype=np.float64, buffer=shm.buf)[:] = coords
+        with Pool(jobs, initializer=_attach, initargs=(shm.name, coords.shape)) as pool:
+            worker = functools.partial(_intersect_tiles, filtered=filtered, count=count)
+            for part, part_counters in pool.imap(worker, _batches(tiles, batch_size)):
+                yield part
+                if counters is not None and part_counters:
+                    counters.update(part_counters)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def calculate_intersections_parallel_arrays(segments, jobs=None, tile_size=TILE_SIZE, filtered=False, counters=None):
+    """Like `fast_inter.calculate_intersections_arrays`, but with the tiles distributed over `jobs` processes.
+
+    The float64 coordinates are placed in shared memory once instead of being sent to every worker, only the
+    resulting arrays are transferred back. They are merged in tile order, so the result is the same as the serial
+    one. Object arrays (e.g. of `Fraction`s) cannot be shared and are processed serially.
+    """
+    coords = as_coords(segments)
+    parts = _tile_results(coords, jobs or os.cpu_count(), tile_size, filtered, counters, count=False)
+    return IntersectionArrays.concatenate(parts, dtype=coords.dtype)
+
+
+def calculate_intersections_parallel(segments, jobs=None, tile_size=TILE_SIZE, filtered=False, counters=None):
+    """Yield the intersections in the tuple format of `calculate_intersections_vectorized`, computed by `jobs`
+    processes."""
+    coords = as_coords(segments)
+    yield from calculate_intersections_parallel_arrays(coords, jobs, tile_size, filtered, counters).to_tuples(coords)
+
+
+def count_intersections_parallel(segments, jobs=None, tile_size=TILE_SIZE, filtered=False, counters=None):
+    """Count the intersections per `IntersectionType` without building them, the workers only send back the counts of
+    their batches of tiles."""
+    coords = as_coords(segments)
+    parts = _tile_results(coords, jobs or os.cpu_count(), tile_size, filtered, counters, count=True)
+    return sum(parts, collections.Counter())
@@ -0,0 +1,88 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class ResultStore:
+    """The meta data of all runs in one SQLite database, instead of a .meta.json file next to every output.
+
+    Runs are keyed by their output file, so re-running a subset of the runs only replaces their rows. The columns most
+    queries filter on are indexed, the full meta data is kept as JSON. Safe to use from several threads, and from
+    several processes thanks to WAL mode.
+    """
+    COLUMNS = ("output", "input", "command", "host", "starttime", "exit_code")
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.create_function("REGEXP", 2, lambda pattern, value: value is not None and
+                                 re.search(pattern, value) is not None)
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (output TEXT PRIMARY KEY, input TEXT, command TEXT, "
+                         "host TEXT, starttime TEXT, exit_code INTEGER, meta TEXT)")
+        for column in ("input", "command", "host", "starttime"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS runs_{column} ON runs ({column})")
+
+    def get(self, output):
+        """The meta data of the run writing to `output`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT meta FROM runs WHERE output=?", (str(output),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, *metas):
+        """Insert or replace the meta data of runs in one transaction."""
+        rows = [(*(meta.get(c) for c in self.COLUMNS), json.dumps(meta)) for meta in metas]
+        sql = f"INSERT OR REPLACE INTO runs VALUES ({', '.join('?' * (len(self.COLUMNS) + 1))})"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(sql, rows)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def query(self, only_files=None, exclude_files=None, only_commands=None, exclude_commands=None, host=None,
+              since=None):
+        """The meta data of all runs matching the filters, by input and command. Files and commands are filtered with
+        regexes as in `summarize`, `since` is an ISO start time."""
+        where, params = [], []
+        for column, pattern, negate in (("input", only_files, False), ("input", exclude_files, True),
+                                        ("command", only_commands, False), ("command", exclude_commands, True)):
+            if pattern:
+                where.append(f"{'NOT ' if negate else ''}{column} REGEXP ?")
+                params.append(pattern)
+        if host:
+            where.append("host=?")
+            params.append(host)
+        if since:
+            where.append("starttime>=?")
+            params.append(since)
+        sql = "SELECT meta FROM runs" + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY input, command"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(meta) for meta, in rows]
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_result_store(path):
+    """Whether `path` is an SQLite database, as written by `ResultStore`, rather than e.g. a CSV or meta data file."""
+    path = Path(path)
+    if not path.is_file():
+        return False
+    with open(path, "rb") as f:
+        return f.read(16) == b"SQLite format 3\0"
@@ -1,64 +1,139 @@
 import argparse
+import functools
 import inspect
+import json
+import statistics
 import sys
 import time
 
+from segintbench.bundle import split_bundle_spec
 from segintbench.utils import *
 
 
-def main(parse_bin, calculate_intersections, postprocess=None):
+def main(parse_bin, calculate_intersections, postprocess=None, extra_args=None, count_intersections=None):
+    """Run an adapter. `extra_args` maps option flags to `add_argument` keywords of additional options, whose values
+    are passed as keyword arguments to `calculate_intersections` and `count_intersections`.
+
+    Without `-a`, intersections are only counted: by `count_intersections` if given, which should return a `Counter`
+    like `count_intersection_types`, and otherwise by consuming the generator returned by `calculate_intersections`.
+
+    With `--repeat N`, the calculation is run `--warmup` times untimed and then `N` times on the already parsed input,
+    and the result, memory and the min, median, stdev and all samples of the time in nanoseconds are printed as JSON
+    instead of the three lines of result, time in milliseconds and memory, together with the per-type counts if the
+    intersections are classified. `--memory-source` adds the peak memory measured by `measure_peak_memory` in
+    additional untimed runs to the JSON output. `--type-counts` prints the per-type counts to stderr, so that the
+    output keeps its format.
+    """
     # Argument parser setup
     parser = argparse.ArgumentParser(description="Process a CSV file.")
     parser.add_argument('-f', '--file', required=True, help='Path to the CSV file')
     parser.add_argument('-a', '--accuracy', action='store_true', help='Print intersections if this flag is set')
     parser.add_argument('-e', '--echo', action='store_true', help='Print parsed coordinates for parser validation')
+    parser.add_argument('-b', '--binary', action='store_true',
+                        help='With -a, write the intersections in binary instead of as text, see write_points_binary')
+    parser.add_argument('--repeat', type=int, default=None,
+                        help='Time this many runs of the calculation and print the timings as JSON')
+    parser.add_argument('--warmup', type=int, default=0, help='Untimed runs of the calculation before --repeat')
+    parser.add_argument('--type-counts', action='store_true',
+                        help='Without -a, also print the number of intersections per type as JSON to stderr')
+    parser.add_argument('--memory-source', action='append', choices=MEMORY_SOURCES, default=[],
+                        help='Also measure the peak memory with this source in an untimed run and print the results '
+                             'as JSON; maxrss counts all pages the computation touches, including inherited ones')
+    extra = [parser.add_argument(*flags, **kwargs).dest for flags, kwargs in (extra_args or {}).items()]
 
     args = parser.parse_args()
+    if args.memory_source and args.accuracy:
+        parser.error("--memory-source cannot be combined with -a")
     filepath = args.file
+    if extra:
+        kwargs = {d: getattr(args, d) for d in extra}
+        calculate_intersections = functools.partial(calculate_intersections, **kwargs)
+        if count_intersections:
+            count_intersections = functools.partial(count_intersections, **kwargs)
 
     # Validate input file
-    if not filepath.endswith(".csv"):
-        print("Error: The specified file is not a CSV file.")
+    path, case = split_bundle_spec(filepath)
+    if not str(path).endswith(SEGMENT_SUFFIXES) and case is None:
+        print("Error: The specified file is not a (compressed) CSV, .segb or bundle#case file.")
         exit(1)
 
-    if not os.path.exists(filepath):
-        print(f"Error: The file {filepath} does not exist.")
+    if not os.path.exists(path):
+        print(f"Error: The file {path} does not exist.")
         exit(1)
 
-    # Read and parse segments from the file
-    segments = list(read_segments_from_csv(filepath, decode=parse_bin))
+    # Read and parse segments from the file, doubles are kept in a single array
+    segments = read_segments(filepath, decode=parse_bin)
 
     if args.echo:
         write_segments_to_csv(segments, sys.stdout, False)
         return 1
 
-    # Main execution
-    initial_memory = get_memory_usage()
-    start_time = time.perf_counter()
+    def measure():
+        # Calculate intersections, only keeping them if they are printed
+        if not args.accuracy and count_intersections:
+            return count_intersections(segments), None
+        intersections = calculate_intersections(segments)
+        if inspect.isgenerator(intersections):
+            if args.accuracy:
+                return None, list(intersections)
+            return count_intersection_types(intersections), None
+        return None, intersections
 
-    # Calculate intersections
-    intersections = calculate_intersections(segments)
-    if inspect.isgenerator(intersections):
-        intersections = list(intersections)
+    for _ in range(args.warmup):
+        measure()
 
-    end_time = time.perf_counter()
+    # Main execution
+    initial_memory = get_memory_usage()
+    samples = []
+    for _ in range(args.repeat or 1):
+        start_time = time.perf_counter_ns()
+        counts, intersections = measure()
+        samples.append(time.perf_counter_ns() - start_time)
     final_memory = get_memory_usage()
 
-    execution_time = end_time - start_time
     memory_usage = final_memory - initial_memory
-    execution_time_ms = int(execution_time * 1000)
+    execution_time_ms = samples[0] // 1_000_000
+    memory_peaks = None
+    if args.memory_source:
+        memory_peaks = measure_peak_memory(measure, args.memory_source)
 
-    if postprocess:
-        intersections = postprocess(intersections)
-    total_intersections = len(intersections)
+    if counts is not None:
+        total_intersections = reported_points(counts)
+    else:
+        if args.binary and isinstance(intersections, list) and intersections and \
+                isinstance(intersections[0][0], IntersectionType):
+            intersections = list(intersection_points(intersections))  # raw points instead of postprocessed strings
+        elif postprocess:
+            intersections = postprocess(intersections)
+        total_intersections = len(intersections)
 
     # Output results
-    if args.accuracy:
-        print("p_x;p_y")
-        for x, y in intersections:
-            print(f"{x};{y}")
+    if args.accuracy and args.binary:
+        sys.stdout.flush()
+        write_points_binary([(bin2float(x), bin2float(y)) if isinstance(x, str) else (x, y)
+                             for x, y in intersections], sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    elif args.accuracy:
+        sys.stdout.write("p_x;p_y\n")
+        for i in range(0, len(intersections), 65536):
+            sys.stdout.write("".join(f"{x};{y}\n" for x, y in intersections[i:i + 65536]))
+    elif args.repeat or memory_peaks:
+        timings = {
+            "min": min(samples),
+            "median": int(statistics.median(samples)),
+            "stdev": int(statistics.stdev(samples)) if len(samples) > 1 else 0,
+            "samples": samples,
+        }
+        result = {"result": total_intersections, "memory": memory_usage, "time_ns": timings}
+        if memory_peaks:
+            result["memory_peak"] = memory_peaks
+        if counts is not None and None not in counts:
+            result["counts"] = {t.name.lower(): counts[t] for t in IntersectionType}
+        print(json.dumps(result))
     else:
         print(total_intersections)
         print(execution_time_ms)
         print(memory_usage)
+    if args.type_counts and counts is not None and None not in counts:
+        print(json.dumps({t.name.lower(): counts[t] for t in IntersectionType}), file=sys.stderr)
     return 0
@@ -0,0 +1,78 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+
+def thread_siblings(cpu):
+    """Logical CPUs sharing a physical core with `cpu` (hyperthreads), including `cpu` itself."""
+    path = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+    if not path.is_file():
+        return {cpu}
+    siblings = set()
+    for part in path.read_text().strip().split(","):
+        first, _, last = part.partition("-")
+        siblings.update(range(int(first), int(last or first) + 1))
+    return siblings
+
+
+def select_cpus(count=None, reserve_siblings=False):
+    """The CPUs jobs are pinned to, at most `count` of the ones this process may run on. With `reserve_siblings`, only
+    one hyperthread per physical core is used and its siblings are left idle."""
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    cpus = []
+    for cpu in available:
+        if reserve_siblings and any(cpu in thread_siblings(c) for c in cpus):
+            continue
+        cpus.append(cpu)
+    return cpus[:count or None]
+
+
+def pin_to_cpu(cpu):
+    """Restrict the calling process to `cpu`, if it is not None and the platform supports it."""
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+
+
+def run_pinned(func, jobs, cpus, isolated=(), desc=None):
+    """Call `func(job, cpu=cpu)` for all `jobs` and `isolated` jobs, each running alone on one of `cpus` at a time.
+
+    The `isolated` jobs run one after the other on the first cpu, while the others share the remaining cpus, or also run
+    on the first cpu once the isolated jobs are done if there is only one.
+    """
+    jobs, isolated = list(jobs), list(isolated)
+    if not cpus:
+        cpus = [None]  # no pinning
+    free = queue.Queue()
+    for cpu in (cpus[1:] if isolated else cpus):
+        free.put(cpu)
+    lock = threading.Lock()
+
+    with tqdm(total=len(jobs) + len(isolated), desc=desc) as pb:
+        def done(_):
+            with lock:
+                pb.update()
+
+        def run_isolated():
+            for job in isolated:
+                func(job, cpu=cpus[0])
+                done(job)
+            if len(cpus) == 1:
+                free.put(cpus[0])
+
+        def run_shared(job):
+            cpu = free.get()
+            try:
+                func(job, cpu=cpu)
+            finally:
+                free.put(cpu)
+            done(job)
+
+        with ThreadPoolExecutor(max_workers=len(cpus) + 1) as ex:
+            fs = [ex.submit(run_isolated)] if isolated else []
+            fs.extend(ex.submit(run_shared, job) for job in jobs)
+            for future in fs:
+                future.result()
@@ -0,0 +1,176 @@
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from segintbench.fast_inter import as_coords, intersect_pairs
+from segintbench.grid_inter import iter_grid_pairs
+from segintbench.hashing import DEFAULT_HASH_CACHE
+from segintbench.utils import DET_ERRBOUND, MIN_FILTER_MAGNITUDE, IntersectionType
+
+# bump whenever the computed statistics change, so that cached ones are not used anymore
+STATS_VERSION = 1
+DEFAULT_STAT_CACHE = DEFAULT_HASH_CACHE.with_name("stats.sqlite")
+STAT_COLUMNS = ("segs", "combs", "points", "intersection_points", "true_intersection_points", "length_0", "horiz",
+                "vert", "same_x", "same_y", "same_p", "overlap", "online", "intersect")
+
+
+def endpoint_stats(coords):
+    """Statistics of the endpoints of the segments in the (n,4) array `coords` and the (m,2) array of distinct
+    endpoints."""
+    coords = np.asarray(coords, dtype=np.float64) + 0.0  # adding 0.0 normalizes -0.0, which equals 0.0
+    x1, y1, x2, y2 = coords.T
+    n = len(coords)
+    length_0 = (x1 == x2) & (y1 == y2)
+    horiz = ~length_0 & (x1 == x2)
+    vert = ~length_0 & (x1 != x2) & (y1 == y2)
+    points = np.unique(np.concatenate([coords[:, 0:2], coords[:, 2:4]]), axis=0)
+    return {
+        "segs": n, "combs": n * (n - 1) // 2, "points": len(points),
+        "length_0": int(length_0.sum()), "horiz": int(horiz.sum()), "vert": int(vert.sum()),
+        "same_x": 2 * n - len(np.unique(np.concatenate([x1, x2]))),
+        "same_y": 2 * n - len(np.unique(np.concatenate([y1, y2]))),
+        "same_p": 2 * n - len(points),
+    }, points
+
+
+def exact_crossings(a, b):
+    """Yield the exact crossing points of the non-parallel segments in the rows of `a` and `b`, with both coordinates
+    as reduced (numerator, denominator) pairs like `float.as_integer_ratio`, which hash much faster than `Fraction`s.
+
+    All coordinates of a pair are scaled to integers by a common power of two, so that only the final division needs
+    to be reduced.
+    """
+    for row in np.concatenate([a, b], axis=1).tolist():
+        ratios = [v.as_integer_ratio() for v in row]
+        scale = max(d for _, d in ratios)  # all denominators are powers of two
+        x1, y1, x2, y2, x3, y3, x4, y4 = (num * (scale // d) for num, d in ratios)
+        dx1, dy1, dx2, dy2, dx3, dy3 = x2 - x1, y2 - y1, x4 - x3, y4 - y3, x1 - x3, y1 - y3
+        det = dx1 * dy2 - dx2 * dy1
+        det2 = dx2 * dy3 - dx3 * dy2
+        num_x, num_y, den = x1 * det + det2 * dx1, y1 * det + det2 * dy1, scale * det
+        if den < 0:
+            num_x, num_y, den = -num_x, -num_y, -den
+        gx, gy = math.gcd(num_x, den), math.gcd(num_y, den)
+        yield (num_x // gx, den // gx), (num_y // gy, den // gy)
+
+
+def crossing_bounds(a, b):
+    """Enclose the x coordinates of the crossing points of the segments in the rows of `a` and `b` in intervals
+    [lo, hi], using float arithmetic and the error bound of the filtered predicates. Both are nan for rows for which
+    the bound does not hold, e.g. due to underflow or nearly parallel segments."""
+    with np.errstate(all="ignore"):
+        x1, y1, x2, y2 = a.T
+        x3, y3, x4, y4 = b.T
+        dx1, dy1, dx2, dy2, dx3, dy3 = x2 - x1, y2 - y1, x4 - x3, y4 - y3, x1 - x3, y1 - y3
+        det, det2 = dx1 * dy2 - dx2 * dy1, dx2 * dy3 - dx3 * dy2
+        mag, mag2 = np.abs(dx1 * dy2) + np.abs(dx2 * dy1), np.abs(dx2 * dy3) + np.abs(dx3 * dy2)
+        err, err2 = DET_ERRBOUND * mag, DET_ERRBOUND * mag2
+        sign = np.where(det < 0, -1.0, 1.0)
+        den_lo, den_hi = det * sign - err, det * sign + err
+        num_lo, num_hi = det2 * sign - err2, det2 * sign + err2
+        t_lo = np.clip(np.minimum(num_lo / den_lo, num_lo / den_hi), 0, 1)
+        t_hi = np.clip(np.maximum(num_hi / den_lo, num_hi / den_hi), 0, 1)
+        # generously cover the rounding errors of computing the interval itself
+        slack = 1e-14 * (np.abs(x1) + np.abs(x2)) + 1e-300
+        lo = x1 + np.minimum(t_lo * dx1, t_hi * dx1) - slack
+        hi = x1 + np.maximum(t_lo * dx1, t_hi * dx1) + slack
+        valid = ((den_lo > 0) & (mag >= MIN_FILTER_MAGNITUDE) & (mag2 >= MIN_FILTER_MAGNITUDE) &
+                 np.isfinite(lo) & np.isfinite(hi))
+    return np.where(valid, lo, np.nan), np.where(valid, hi, np.nan)
+
+
+def intersection_stats(coords, endpoints):
+    """Count the intersections of all pairs of segments by type and the distinct crossing points, also excluding those
+    that are endpoints in the (m,2) array `endpoints`.
+
+    Candidate pairs come from the grid broad phase and are decided with filtered predicates, which fall back to exact
+    arithmetic for ambiguous pairs. Crossing points are only computed exactly if their `crossing_bounds` overlap with
+    those of another crossing or contain the x coordinate of an endpoint, all others are certainly distinct.
+    """
+    coords = as_coords(coords)
+    counts = Counter()
+    parts = [(np.empty(0), np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))]
+    with np.errstate(over="ignore", invalid="ignore"):  # pairs overflowing in float arithmetic are evaluated exactly
+        for first, second in iter_grid_pairs(coords):
+            found = intersect_pairs(coords, first, second, filtered=True)
+            counts += found.type_counts()
+            true = found.kind == IntersectionType.TRUE_INTERSECTION.value
+            first, second = found.first[true].astype(np.int32), found.second[true].astype(np.int32)
+            parts.append((*crossing_bounds(coords[first], coords[second]), first, second))
+    lo, hi, first, second = map(np.concatenate, zip(*parts))
+
+    # crossings without bounds are bounded by their exact value rounded in both directions
+    unbounded = np.flatnonzero(np.isnan(lo))
+    for i, ((num, den), _) in zip(unbounded, exact_crossings(coords[first[unbounded]], coords[second[unbounded]])):
+        x = num / den  # correctly rounded
+        lo[i], hi[i] = np.nextafter(x, -np.inf), np.nextafter(x, np.inf)
+
+    order = np.argsort(lo, kind="stable")
+    lo, hi = lo[order], hi[order]
+    overlapping = np.zeros(len(lo), dtype=bool)
+    overlapping[1:] = lo[1:] <= np.maximum.accumulate(hi)[:-1]
+    overlapping[:-1] |= hi[:-1] >= lo[1:]
+    xs = np.unique(endpoints[:, 0])
+    nearest = np.minimum(np.searchsorted(xs, lo), len(xs) - 1)
+    if len(xs):
+        overlapping |= (xs[nearest] >= lo) & (xs[nearest] <= hi)
+    exact = order[overlapping]
+    distinct = len(lo) - len(exact)
+
+    crossings = set(exact_crossings(coords[first[exact]], coords[second[exact]]))
+    endpoints = {(x.as_integer_ratio(), y.as_integer_ratio()) for x, y in endpoints.tolist()}
+    return {
+        "intersection_points": distinct + len(crossings),
+        "true_intersection_points": distinct + sum(1 for p in crossings if p not in endpoints),
+        "overlap": counts[IntersectionType.SEGMENT_OVERLAP],
+        "online": counts[IntersectionType.POINT_OVERLAP],
+        "intersect": counts[IntersectionType.TRUE_INTERSECTION],
+    }
+
+
+def segment_stats(segments):
+    """The statistics of a test file as reported by `segintbench-test stat`, computed from its segments."""
+    coords = as_coords(segments)
+    stats, endpoints = endpoint_stats(coords)
+    stats.update(intersection_stats(coords, endpoints))
+    return {k: stats[k] for k in STAT_COLUMNS}
+
+
+class StatCache:
+    """Statistics of test files by the hash of their content, persistently in SQLite. Safe to use from several
+    threads."""
+
+    def __init__(self, cache=DEFAULT_STAT_CACHE):
+        Path(cache).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS stats (digest TEXT, version INTEGER, stats TEXT, "
+                         "PRIMARY KEY (digest, version))")
+
+    def get(self, digest):
+        with self._lock:
+            row = self._db.execute("SELECT stats FROM stats WHERE digest=? AND version=?",
+                                   (digest, STATS_VERSION)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, digest, stats):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO stats VALUES (?, ?, ?)",
+                             (digest, STATS_VERSION, json.dumps(stats)))
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,224 @@
+import heapq
+import random
+from decimal import Decimal
+from fractions import Fraction
+from typing import List, NamedTuple
+
+from segintbench.utils import Point
+
+
+class SweepEvent(NamedTuple):
+    """An intersection point found by the sweep together with the indices of all segments through it.
+
+    Zero-length segments are listed in both `starting` and `ending`.
+    """
+    point: Point
+    starting: List[int]
+    ending: List[int]
+    interior: List[int]
+
+
+def _exact(v):
+    if isinstance(v, (int, Fraction)):
+        return v
+    if isinstance(v, (float, Decimal)):
+        return Fraction(v)
+    return Fraction(str(v))
+
+
+def _orient(a, b, p):
+    """Positive if p lies left of (above) the line through a and b, negative if right of (below) it."""
+    return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+
+
+# The status structure is a treap, ordered by the vertical order of the segments just right of the sweep line.
+# Nodes are lists of [segment, priority, left, right]. Lookups never compare keys, but split the treap at the
+# boundary of a predicate that is monotone along the current order.
+_SEG, _PRIO, _LEFT, _RIGHT = range(4)
+
+
+def _split(node, pred):
+    """Split into the prefix of segments for which `pred` holds and the remaining suffix."""
+    if node is None:
+        return None, None
+    if pred(node[_SEG]):
+        left, right = _split(node[_RIGHT], pred)
+        node[_RIGHT] = left
+        return node, right
+    else:
+        left, right = _split(node[_LEFT], pred)
+        node[_LEFT] = right
+        return left, node
+
+
+def _merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a[_PRIO] > b[_PRIO]:
+        a[_RIGHT] = _merge(a[_RIGHT], b)
+        return a
+    else:
+        b[_LEFT] = _merge(a, b[_LEFT])
+        return b
+
+
+def _first(node):
+    if node is None:
+        return None
+    while node[_LEFT] is not None:
+        node = node[_LEFT]
+    return node[_SEG]
+
+
+def _last(node):
+    if node is None:
+        return None
+    while node[_RIGHT] is not None:
+        node = node[_RIGHT]
+    return node[_SEG]
+
+
+def _inorder(node):
+    out, stack = [], []
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node[_LEFT]
+        node = stack.pop()
+        out.append(node[_SEG])
+        node = node[_RIGHT]
+    return out
+
+
+def _build(segs):
+    root = None
+    for s in segs:
+        root = _merge(root, [s, random.random(), None, None])
+    return root
+
+
+def _endpoints(segments):
+    """The exact lexicographically smaller and larger endpoints of all segments."""
+    left, right = [], []
+    for seg in segments:
+        x1, y1, x2, y2 = map(_exact, seg.coords())
+        a, b = (x1, y1), (x2, y2)
+        if b < a:
+            a, b = b, a
+        left.append(a)
+        right.append(b)
+    return left, right
+
+
+def sweep_intersections(segments):
+    """Find all intersection points of the segments with a Bentley-Ottmann sweep in O((n+k) log n).
+
+    Coordinates are converted to exact rationals, so float and `Fraction` inputs are both handled exactly,
+    including vertical, zero-length and collinear overlapping segments. Yields a `SweepEvent` for every point
+    shared by at least two segments (for overlaps, the start and end of the overlap) in lexicographic order.
+    """
+    left, right = _endpoints(segments)
+
+    # the order of segments through a common point just right of it: by slope, vertical segments last
+    slope = [(1, 0) if a[0] == b[0] else (0, Fraction(b[1] - a[1]) / (b[0] - a[0])) for a, b in zip(left, right)]
+
+    events = {}  # point -> indices of the (non-zero-length and zero-length) segments starting there
+    for i, (a, b) in enumerate(zip(left, right)):
+        events.setdefault(a, []).append(i)
+        events.setdefault(b, [])
+    queue = list(events.keys())
+    heapq.heapify(queue)
+
+    def below(p):
+        def pred(s):
+            a, b = left[s], right[s]
+            if a[0] == b[0]:
+                return b[1] < p[1]
+            return _orient(a, b, p) > 0
+
+        return pred
+
+    def not_above(p):
+        def pred(s):
+            a, b = left[s], right[s]
+            if a[0] == b[0]:
+                return a[1] <= p[1]
+            return _orient(a, b, p) >= 0
+
+        return pred
+
+    def schedule(s, t, p):
+        """Add the crossing of s and t to the queue if it lies right of the current event p."""
+        a1, b1, a2, b2 = left[s], right[s], left[t], right[t]
+        d1 = (b1[0] - a1[0], b1[1] - a1[1])
+        d2 = (b2[0] - a2[0], b2[1] - a2[1])
+        det = d1[0] * d2[1] - d1[1] * d2[0]
+        if det == 0:
+            return  # parallel, overlaps start and end at segment endpoints which are events anyway
+        d3 = (a2[0] - a1[0], a2[1] - a1[1])
+        num_t = d3[0] * d2[1] - d3[1] * d2[0]
+        num_u = d3[0] * d1[1] - d3[1] * d1[0]
+        if det < 0:
+            det, num_t, num_u = -det, -num_t, -num_u
+        if not (0 <= num_t <= det and 0 <= num_u <= det):
+            return
+        t = Fraction(num_t, det) if isinstance(num_t, int) else num_t / det
+        q = (a1[0] + t * d1[0], a1[1] + t * d1[1])
+        if q > p and q not in events:
+            events[q] = []
+            heapq.heappush(queue, q)
+
+    root = None
+    while queue:
+        p = heapq.heappop(queue)
+        starting = events.pop(p)
+
+        lower, rest = _split(root, below(p))
+        through, upper = _split(rest, not_above(p))
+        through = _inorder(through)
+        ending = [s for s in through if right[s] == p]
+        interior = [s for s in through if right[s] != p]
+        zero = [s for s in starting if right[s] == p]
+
+        if len(starting) + len(through) > 1:
+            yield SweepEvent(Point(*p), starting, ending + zero, interior)
+
+        middle = sorted([s for s in starting if right[s] != p] + interior, key=lambda s: (slope[s], s))
+        sl, sr = _last(lower), _first(upper)
+        root = _merge(_merge(lower, _build(middle)), upper)
+
+        if not middle:
+            if sl is not None and sr is not None:
+                schedule(sl, sr, p)
+        else:
+            if sl is not None:
+                schedule(sl, middle[0], p)
+            if sr is not None:
+                schedule(middle[-1], sr, p)
+
+
+def calculate_intersections_sweep(segments, conv=lambda x: x):
+    """Yield the intersection points of all pairs of segments like `calculate_intersections_pairwise`, i.e. the common
+    point of each pair meeting in a single point and the start and end of the overlap of collinear overlapping pairs,
+    with coordinates converted by `conv`. Points shared by several segments are thus reported once per pair."""
+    segments = list(segments)
+    left, right = _endpoints(segments)
+    for event in sweep_intersections(segments):
+        p = (event.point.x, event.point.y)
+        through = list(dict.fromkeys(event.starting + event.ending + event.interior))  # zero-length ones are in both
+        for i, s in enumerate(through):
+            ds = (right[s][0] - left[s][0], right[s][1] - left[s][1])
+            for t in through[i + 1:]:
+                dt = (right[t][0] - left[t][0], right[t][1] - left[t][1])
+                if ds[0] * dt[1] - ds[1] * dt[0] != 0:
+                    yield Point(conv(p[0]), conv(p[1]))
+                    continue
+                # collinear, the overlap is reported at the event of its start
+                start, end = max(left[s], left[t]), min(right[s], right[t])
+                if start != p:
+                    continue
+                yield Point(conv(p[0]), conv(p[1]))
+                if end != start:
+                    yield Point(conv(end[0]), conv(end[1]))
@@ -1,8 +1,8 @@
 import random
-from fractions import Fraction
 
 import numpy as np
 
+from segintbench.dyadic_inter import calculate_intersections_dyadic
 from segintbench.utils import *
 
 near_inf = math.nextafter(math.inf, -math.inf)
@@ -462,7 +462,7 @@ def star_intersections_9(num_segments: int, num_intersections: int, max_coord: f
         segments.append(Segment(left_points[i], right_points[i]))
 
     # Adjust segments to reach the desired number of intersections
-    intersections = list(calculate_intersections_pairwise(segments, conv=Fraction))
+    intersections = list(calculate_intersections_dyadic(segments))
 
     while len(intersections) < num_intersections:
         i, j = random.sample(range(num_segments), 2)
@@ -474,7 +474,7 @@ def star_intersections_9(num_segments: int, num_intersections: int, max_coord: f
         segments[j] = Segment(segments[j].p1, segments[i].p2)
 
         # Recalculate intersections
-        new_intersections = list(calculate_intersections_pairwise(segments, conv=Fraction))
+        new_intersections = list(calculate_intersections_dyadic(segments))
 
         if len(new_intersections) > num_intersections:
             # Revert if too many intersections
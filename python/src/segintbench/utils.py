@@ -1,17 +1,29 @@
+import bz2
+import gzip
 import itertools
+import lzma
 import math
 import os
 import re
-from collections import namedtuple
+import struct
+from collections import Counter, namedtuple
+from enum import Enum, auto
 from fractions import Fraction
 from pathlib import Path
 from typing import NamedTuple
 
 import click
+import numpy as np
 
 Point = namedtuple('Point', 'x y')
 
 
+class IntersectionType(Enum):
+    TRUE_INTERSECTION = auto()
+    POINT_OVERLAP = auto()
+    SEGMENT_OVERLAP = auto()
+
+
 class Segment(NamedTuple):
     p1: Point
     p2: Point
@@ -63,6 +75,46 @@ class Segment(NamedTuple):
         return slope(self.p1, self.p2)
 
 
+class SegmentArray:
+    """Segments stored column-wise in a single (n,4) float64 array of x1, y1, x2, y2 rows.
+
+    Behaves like a read-only sequence of `Segment`s, which are only built on access. Slicing and indexing with
+    arrays returns views resp. copies as another `SegmentArray`, `coords()` returns the underlying array.
+    """
+    __slots__ = ("_coords",)
+
+    def __init__(self, coords=()):
+        self._coords = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+
+    @classmethod
+    def from_segments(cls, segments):
+        if isinstance(segments, cls):
+            return segments
+        return cls(np.fromiter((v for seg in segments for v in seg.coords()), dtype=np.float64))
+
+    def coords(self):
+        return self._coords
+
+    def __array__(self, dtype=None, copy=None):
+        return self._coords if dtype is None else self._coords.astype(dtype)
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return Segment.build(*self._coords[item].tolist())
+        return SegmentArray(self._coords[item])
+
+    def __iter__(self, chunk_size=4096):
+        for i in range(0, len(self._coords), chunk_size):
+            for row in self._coords[i:i + chunk_size].tolist():
+                yield Segment.build(*row)
+
+    def __repr__(self):
+        return f"SegmentArray({len(self)} segments)"
+
+
 # Function to get memory usage
 def get_memory_usage():
     import psutil
@@ -70,6 +122,74 @@ def get_memory_usage():
     return process.memory_info().rss  # Memory usage in bytes
 
 
+# peak memory sources, each measured in a separate run of the computation, see measure_peak_memory
+MEMORY_SOURCES = ("tracemalloc", "maxrss", "sampled")
+
+
+def _tracemalloc_peak(func):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def _maxrss_peak(func):
+    # the high-water mark of the parent already includes parsing the input, so measure the ru_maxrss increase of a
+    # forked child instead. The child does not start with the full RSS of the parent though: pages it touches again,
+    # e.g. of the interpreter, libraries and the parsed input, are counted anew. The increase is thus the memory the
+    # computation touches rather than allocates, at least some MB for the smallest inputs.
+    import resource
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            func()
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+            os.write(write_fd, struct.pack("<q", peak * 1024))  # ru_maxrss is in KB on Linux
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    if len(data) != 8:
+        raise RuntimeError("Peak memory measurement child failed.")
+    return struct.unpack("<q", data)[0]
+
+
+def _sampled_peak(func, interval=0.001):
+    import threading
+    base = peak = get_memory_usage()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, get_memory_usage())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        func()
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak, get_memory_usage()) - base
+
+
+def measure_peak_memory(func, sources=MEMORY_SOURCES):
+    """Run `func` once per source and return the peak memory in bytes above the level before each run by source:
+    `tracemalloc` for the Python heap (including numpy buffers), `maxrss` as `ru_maxrss` delta of a forked child, i.e.
+    all memory touched by the computation including inherited pages, and `sampled` by polling the RSS from a thread."""
+    peaks = {"tracemalloc": _tracemalloc_peak, "maxrss": _maxrss_peak, "sampled": _sampled_peak}
+    return {source: peaks[source](func) for source in sources}
+
+
 def slope(a, b):
     dx = Fraction(a.x) - b.x
     dy = Fraction(a.y) - b.y
@@ -137,14 +257,184 @@ def find_collinear_intersections(seg1, seg2, conv=lambda x: x):
         yield conv(overlap_end)
 
 
+_EPS = 2.0 ** -53
+# Shewchuk's bound on the absolute error of a 2x2 determinant of coordinate differences evaluated in double precision,
+# relative to the sum of the magnitudes of both products
+DET_ERRBOUND = (3.0 + 16.0 * _EPS) * _EPS
+# below this magnitude, products may have lost precision to underflow and the error bound does not hold
+MIN_FILTER_MAGNITUDE = 2.0 ** -900
+
+
+def filtered_intersection(seg1, seg2):
+    """Decide whether two segments with finite float coordinates intersect, using double precision where it is safe.
+
+    Returns the intersection point, False if the segments certainly do not intersect, or None if the result is
+    ambiguous within the forward error bound and needs to be evaluated exactly.
+    """
+    x1, y1, x2, y2 = seg1.coords()
+    x3, y3, x4, y4 = seg2.coords()
+
+    dx1 = x2 - x1
+    dx2 = x4 - x3
+    dy1 = y2 - y1
+    dy2 = y4 - y3
+    dx3 = x1 - x3
+    dy3 = y1 - y3
+
+    p, q = dx1 * dy2, dx2 * dy1
+    p1, q1 = dx1 * dy3, dx3 * dy1
+    p2, q2 = dx2 * dy3, dx3 * dy2
+    det, det1, det2 = p - q, p1 - q1, p2 - q2
+    mag, mag1, mag2 = abs(p) + abs(q), abs(p1) + abs(q1), abs(p2) + abs(q2)
+    if 0 < mag < MIN_FILTER_MAGNITUDE or 0 < mag1 < MIN_FILTER_MAGNITUDE or 0 < mag2 < MIN_FILTER_MAGNITUDE:
+        return None
+    err, err1, err2 = DET_ERRBOUND * mag, DET_ERRBOUND * mag1, DET_ERRBOUND * mag2
+
+    if not abs(det) > err:
+        return None
+    # non-parallel segments sharing an endpoint touch exactly there (adding 0.0 normalizes -0.0)
+    if (x1 == x3 and y1 == y3) or (x1 == x4 and y1 == y4):
+        return Point(x1 + 0.0, y1 + 0.0)
+    if (x2 == x3 and y2 == y3) or (x2 == x4 and y2 == y4):
+        return Point(x2 + 0.0, y2 + 0.0)
+    if det < 0:
+        det, det1, det2 = -det, -det1, -det2
+    # need 0 <= det1 <= det and 0 <= det2 <= det
+    bounds = ((det1, err1), (det - det1, 2 * (err + err1)), (det2, err2), (det - det2, 2 * (err + err2)))
+    if any(v < -e for v, e in bounds):
+        return False
+    if not all(v > e for v, e in bounds):
+        return None
+    t = det2 / det
+    return Point(x1 + t * dx1, y1 + t * dy1)
+
+
+def calculate_intersections_filtered(segments, counters=None):
+    """Intersect all pairs of float segments with filtered predicates.
+
+    Pairs are decided in double precision together with a forward error bound and only the ambiguous ones fall back
+    to exact evaluation with `Fraction`s. Pairs with non-finite coordinates are evaluated in plain float arithmetic.
+    If a `collections.Counter` is given as `counters`, the number of "filtered", "exact" and "unfiltered" pairs is
+    added to it.
+    """
+    segments = list(segments)
+    finite = [all(map(math.isfinite, seg.coords())) for seg in segments]
+    exact = unfiltered = 0
+    for i, j in itertools.combinations(range(len(segments)), 2):
+        seg1, seg2 = segments[i], segments[j]
+        if not (finite[i] and finite[j]):
+            unfiltered += 1
+            yield from find_intersection(seg1, seg2)
+            continue
+        res = filtered_intersection(seg1, seg2)
+        if res is None:
+            exact += 1
+            for p in find_intersection(seg1, seg2, conv=Fraction):
+                yield Point(float(p.x), float(p.y))
+        elif res:
+            yield res
+
+    if counters is not None:
+        pairs = len(segments) * (len(segments) - 1) // 2
+        counters.update(filtered=pairs - exact - unfiltered, exact=exact, unfiltered=unfiltered)
+
+
+def bounding_box(seg, epsilon=None):
+    """Return (min x, max x, min y, max y) of a segment, grown by epsilon times its extent if given."""
+    x1, y1, x2, y2 = seg.coords()
+    xmin, xmax = min(x1, x2), max(x1, x2)
+    ymin, ymax = min(y1, y2), max(y1, y2)
+    if epsilon:
+        dx, dy = (xmax - xmin) * epsilon, (ymax - ymin) * epsilon
+        return xmin - dx, xmax + dx, ymin - dy, ymax + dy
+    return xmin, xmax, ymin, ymax
+
+
+def candidate_pairs(segments, epsilon=None, counters=None):
+    """Yield the index pairs (i, j), i < j, of all segments with overlapping bounding boxes.
+
+    Uses sort-and-sweep on the x-intervals. If a `collections.Counter` is given as `counters`,
+    the number of "pairs", "candidates" and "pruned" pairs is added to it.
+    """
+    boxes = [bounding_box(seg, epsilon) for seg in segments]
+    active = []
+    candidates = 0
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i][0]):
+        xmin, _, ymin, ymax = boxes[i]
+        active = [j for j in active if boxes[j][1] >= xmin]
+        for j in active:
+            if boxes[j][2] <= ymax and ymin <= boxes[j][3]:
+                candidates += 1
+                yield (j, i) if j < i else (i, j)
+        active.append(i)
+
+    if counters is not None:
+        pairs = len(boxes) * (len(boxes) - 1) // 2
+        counters.update(pairs=pairs, candidates=candidates, pruned=pairs - candidates)
+
+
 # Function to calculate intersections for all segment pairs
-def calculate_intersections_pairwise(segments, epsilon=None, conv=lambda x: x):
+def calculate_intersections_pairwise(segments, epsilon=None, conv=lambda x: x, broad_phase=False, counters=None):
+    if broad_phase:
+        segments = list(segments)
+        for i, j in candidate_pairs(segments, epsilon, counters):
+            yield from find_intersection(segments[i], segments[j], epsilon, conv)
+        return
     for seg1, seg2 in itertools.combinations(segments, 2):
         yield from find_intersection(seg1, seg2, epsilon, conv)
 
 
+def count_intersection_types(intersections):
+    """Consume `intersections` without storing them, counting them per `IntersectionType`.
+
+    Entries that do not start with an `IntersectionType` (e.g. plain `Point`s) are counted under None.
+    """
+    counts = Counter()
+    for i in intersections:
+        counts[i[0] if isinstance(i[0], IntersectionType) else None] += 1
+    return counts
+
+
+def reported_points(counts):
+    """Number of points reported for the given `count_intersection_types`, each segment overlap giving its start and
+    end point."""
+    return sum(counts.values()) + counts[IntersectionType.SEGMENT_OVERLAP]
+
+
+# compressed files are detected by these suffixes and transparently (de)compressed
+COMPRESSIONS = {".gz": gzip, ".xz": lzma, ".bz2": bz2}
+SEGMENT_SUFFIXES = (".csv", ".segb", *(".csv" + ext for ext in COMPRESSIONS))
+
+
+def open_file(file, mode="r", **kwargs):
+    """Like `open`, but streaming (de)compression for files ending in one of the `COMPRESSIONS` suffixes."""
+    module = COMPRESSIONS.get(Path(file).suffix)
+    if module is None:
+        return open(file, mode, **kwargs)
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    return module.open(file, mode, **kwargs)
+
+
+def strip_compression(file):
+    """Remove a compression suffix from the path, e.g. `a.csv.gz` -> `a.csv`."""
+    file = Path(file)
+    return file.with_suffix("") if file.suffix in COMPRESSIONS else file
+
+
+def intersection_points(intersections):
+    """Yield the (x, y) points of `intersections`, which for typed intersections are their start and, for segment
+    overlaps, also their end point."""
+    for i in intersections:
+        if isinstance(i[0], IntersectionType):
+            yield i[3]
+            if i[0] == IntersectionType.SEGMENT_OVERLAP:
+                yield i[4]
+        else:
+            yield i
+
+
 def bin2float(binary_string, single_precision: bool = False):
-    import struct
     if len(binary_string) != (32 if single_precision else 64):
         raise ValueError("Binary string length must be 32 (for float) or 64 (for double).")
     byte_data = int(binary_string, 2).to_bytes(4 if single_precision else 8, byteorder='big')
@@ -153,33 +443,75 @@ def bin2float(binary_string, single_precision: bool = False):
 
 def float2bin(number: float, as_hex: bool = False, single_precision: bool = False) -> str:
     """Convert a float to its binary or hex representation (big-endian)."""
-    import struct
     format_char = '>f' if single_precision else '>d'
     packed = struct.pack(format_char, number)
     base, width = (hex, 2) if as_hex else (bin, 8)
     return ''.join(base(b)[2:].rjust(width, '0') for b in packed)
 
 
-def write_segments_to_csv(segments, file: str, binary_encode=True):
+def bins2floats(data: bytes):
+    """Bulk `bin2float` for the rows of a bit-string CSV file (without header), returning an (n,4) float64 array.
+
+    All lines are expected to have the width of the first one, which allows viewing the data as fixed-width byte
+    matrix. Raises a ValueError otherwise or if the lines are not made up of four `;`-separated 64 bit strings.
+    """
+    if not data.strip():
+        return np.empty((0, 4), dtype=np.float64)
+    width = data.find(b"\n") + 1
+    if width <= 0:
+        width, data = len(data) + 1, data + b"\n"
+    elif not data.endswith(b"\n"):
+        data += data[width - (2 if data[width - 2:width] == b"\r\n" else 1):width]  # terminate the last line
+    if width < 260 or len(data) % width:
+        raise ValueError("Expected lines of equal width.")
+    lines = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)
+    fields = lines[:, :260].reshape(-1, 4, 65)
+    bits = fields[:, :, :64] - np.uint8(ord('0'))
+    if (np.any(bits > 1) or np.any(fields[:, :3, 64] != ord(';'))
+            or np.any(lines[:, 259:] != lines[0, 259:]) or bytes(lines[0, 259:]).strip()):
+        raise ValueError("Expected lines of four ';'-separated 64 bit strings.")
+    return np.packbits(bits, axis=-1).view('>f8').astype(np.float64).reshape(-1, 4)
+
+
+def floats2bins(coords, lineterminator=b"\r\n", columns=4) -> bytes:
+    """Bulk `float2bin`, encoding the rows of an (n,columns) array as lines of a bit-string CSV file (without
+    header)."""
+    coords = np.ascontiguousarray(coords, dtype='>f8').reshape(-1, columns)
+    bits = np.unpackbits(coords.view(np.uint8).reshape(-1, columns, 8), axis=-1)
+    fields = np.empty((len(coords), columns, 65), dtype=np.uint8)
+    fields[:, :, :64] = bits + ord('0')
+    fields[:, :, 64] = ord(';')
+    rows = fields.reshape(len(coords), columns * 65)[:, :-1]
+    term = np.frombuffer(lineterminator, dtype=np.uint8)
+    return np.concatenate([rows, np.broadcast_to(term, (len(coords), len(term)))], axis=1).tobytes()
+
+
+def write_segments_to_csv(segments, file: str, binary_encode=True, chunk_size=65536):
     """Write segments to a CSV with optional binary-encoded float values."""
     import csv
     if isinstance(file, (str, Path)):
         Path(file).parent.mkdir(parents=True, exist_ok=True)
-        file = open(file, 'w', newline='')
+        file = open_file(file, 'w', newline='')
     with file as csvfile:
         writer = csv.writer(csvfile, delimiter=";")
         writer.writerow(['x1', 'y1', 'x2', 'y2'])
 
-        for seg in segments:
-            if binary_encode:
-                writer.writerow(map(float2bin, seg.coords()))
-            else:
-                writer.writerow(seg.coords())
+        if binary_encode:
+            coords = SegmentArray.from_segments(segments).coords()
+            for i in range(0, len(coords), chunk_size):
+                csvfile.write(floats2bins(coords[i:i + chunk_size]).decode('ascii'))
+            return
+        rows = segments.coords().tolist() if isinstance(segments, SegmentArray) else (s.coords() for s in segments)
+        for row in rows:
+            writer.writerow(row)
 
 
 def read_segments_from_csv(file: str, decode=bin2float):
+    if decode is bin2float:
+        yield from read_segment_array(file)
+        return
     if isinstance(file, (str, Path)):
-        file = open(file, 'r')
+        file = open_file(file, 'r')
     with file as csvfile:
         header = next(csvfile).strip()
         if header != "x1;y1;x2;y2":  # Skip the header line
@@ -188,6 +520,137 @@ def read_segments_from_csv(file: str, decode=bin2float):
             yield Segment.build(map(decode, line.strip().split(';')))
 
 
+def read_segment_array(file: str, decode=bin2float):
+    """Like `read_segments_from_csv`, but decode directly into a `SegmentArray` without building `Segment`s.
+
+    Bit strings are decoded in bulk by `bins2floats` if `decode` is `bin2float`.
+    """
+    if isinstance(file, (str, Path)):
+        file = open_file(file, 'rb')
+    with file as csvfile:
+        data = csvfile.read()
+    header, _, body = (data.encode() if isinstance(data, str) else data).partition(b'\n')
+    if header.strip() != b"x1;y1;x2;y2":
+        raise IOError(f"Invalid CSV header {header.strip().decode()!r}.")
+    if decode is bin2float:
+        try:
+            return SegmentArray(bins2floats(body))
+        except ValueError:
+            pass  # let bin2float report the offending value
+    return SegmentArray(np.fromiter((decode(v) for line in body.decode().splitlines() if line.strip()
+                                     for v in line.strip().split(';')), dtype=np.float64))
+
+
+# .segb files: a 32 byte header of magic, format version, numpy dtype string and segment count followed by the raw
+# (count,4) array of x1, y1, x2, y2 rows
+SEGB_MAGIC = b"SEGB"
+SEGB_VERSION = 1
+_SEGB_HEADER = struct.Struct("<4sH2x4sQ12x")
+
+
+def write_segments_to_segb(segments, file):
+    """Write segments as little-endian float64 .segb file."""
+    coords = SegmentArray.from_segments(segments).coords().astype("<f8", copy=False)
+    Path(file).parent.mkdir(parents=True, exist_ok=True)
+    with open(file, "wb") as f:
+        f.write(_SEGB_HEADER.pack(SEGB_MAGIC, SEGB_VERSION, coords.dtype.str.encode(), len(coords)))
+        f.write(np.ascontiguousarray(coords).tobytes())
+
+
+def read_segments_from_segb(file):
+    """Memory-map a .segb file as `SegmentArray`, without reading or parsing it."""
+    with open(file, "rb") as f:
+        header = f.read(_SEGB_HEADER.size)
+    if len(header) != _SEGB_HEADER.size:
+        raise IOError(f"Truncated .segb header in {file}.")
+    magic, version, dtype, count = _SEGB_HEADER.unpack(header)
+    if magic != SEGB_MAGIC or version != SEGB_VERSION:
+        raise IOError(f"Invalid .segb header {magic!r} version {version} in {file}.")
+    if count == 0:
+        return SegmentArray()
+    return SegmentArray(np.memmap(file, dtype=np.dtype(dtype.rstrip(b"\0").decode()), mode="r",
+                                  offset=_SEGB_HEADER.size, shape=(count, 4)))
+
+
+def read_segments(file, decode=bin2float):
+    """Read a .segb or CSV file. Doubles are returned as `SegmentArray`, other values as list of `Segment`s of
+    coordinates converted by `decode`, which always receives bit strings as in the CSV format. Single cases of a
+    bundle can be read with a `bundle.segbundle#category/name` spec."""
+    from segintbench.bundle import read_bundle_case, split_bundle_spec
+    if split_bundle_spec(file)[1] is not None:
+        segments = read_bundle_case(file)
+    elif Path(file).suffix == ".segb":
+        segments = read_segments_from_segb(file)
+    else:
+        segments = None
+    if segments is not None:
+        if decode is bin2float:
+            return segments
+        return [seg.map(lambda v: decode(float2bin(v))) for seg in segments]
+    if decode is bin2float:
+        return read_segment_array(file)
+    return list(read_segments_from_csv(file, decode))
+
+
+# binary -a output: a 32 byte header of magic, format version, integer width and point count followed by either
+# (count,2) little-endian float64 x, y pairs (width 0) or (count,4) numerators and denominators of x and y as signed
+# little-endian integers of the given width in bytes
+POINTS_MAGIC = b"SEGPTS\0\0"
+POINTS_VERSION = 1
+_POINTS_HEADER = struct.Struct("<8sHH4xQ8x")
+
+
+def write_points_binary(points, file):
+    """Write (x, y) points to a binary stream, as float64 if all coordinates are floats and exactly otherwise."""
+    values = [v for p in points for v in p]
+    if all(type(v) is float for v in values):
+        width, data = 0, np.array(values, dtype='<f8').tobytes()
+    else:
+        ints = [i for v in map(Fraction, values) for i in (v.numerator, v.denominator)]
+        if max((abs(i).bit_length() for i in ints), default=0) < 64:
+            width, data = 8, np.array(ints, dtype='<i8').tobytes()
+        else:
+            width = max(abs(i).bit_length() for i in ints) // 8 + 1
+            data = b"".join(i.to_bytes(width, 'little', signed=True) for i in ints)
+    file.write(_POINTS_HEADER.pack(POINTS_MAGIC, POINTS_VERSION, width, len(values) // 2))
+    file.write(data)
+
+
+def read_points_binary(file):
+    """Read the output of `write_points_binary`, returning the integer width and a (count,2) float64 array (for width
+    0) or a (count,4*width) uint8 array of the raw integers."""
+    with open(file, 'rb') as f:
+        data = f.read()
+    if len(data) < _POINTS_HEADER.size:
+        raise IOError(f"Truncated binary output header in {file}.")
+    magic, version, width, count = _POINTS_HEADER.unpack_from(data)
+    if magic != POINTS_MAGIC or version != POINTS_VERSION:
+        raise IOError(f"Invalid binary output header {magic!r} version {version} in {file}.")
+    if width == 0:
+        return width, np.frombuffer(data, dtype='<f8', count=2 * count, offset=_POINTS_HEADER.size).reshape(-1, 2)
+    return width, np.frombuffer(data, dtype=np.uint8, count=4 * width * count,
+                                offset=_POINTS_HEADER.size).reshape(-1, 4 * width)
+
+
+def unique_points_csv(width, rows):
+    """Deduplicate the points returned by `read_points_binary` and return them as sorted `p_x;p_y` lines, with doubles
+    as bit strings and exact coordinates as `Fraction` strings. This generally differs from the text adapters print with
+    `-a`, e.g. float reprs or decimals, so the result is only comparable to that of other binary outputs."""
+    if width == 0:
+        # sorting the big-endian bytes sorts like the bit strings
+        keys = np.ascontiguousarray(rows, dtype='>f8').view(np.dtype((np.void, 16))).ravel()
+        uniq = np.unique(keys).view('>f8').reshape(-1, 2)
+        return floats2bins(uniq, b"\n", columns=2).decode('ascii').splitlines(keepends=True)
+    keys = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.shape[1]))).ravel()
+    uniq = np.unique(keys).view(np.uint8).reshape(-1, 4, width)
+    lines = []
+    for xn, xd, yn, yd in uniq:
+        x = Fraction(int.from_bytes(xn, 'little', signed=True), int.from_bytes(xd, 'little', signed=True))
+        y = Fraction(int.from_bytes(yn, 'little', signed=True), int.from_bytes(yd, 'little', signed=True))
+        lines.append(f"{x};{y}\n")
+    return sorted(lines)
+
+
 def parse_timeout(val):
     if isinstance(val, str):
         try:
@@ -211,7 +674,7 @@ def parse_files(files, default_ext, exclude=None):
             yield path
             continue
         elif path.is_dir():
-            iter = path.rglob(default_ext)
+            iter = itertools.chain(path.rglob(default_ext), *(path.rglob(default_ext + ext) for ext in COMPRESSIONS))
         elif re.search(r"[*?\[]", file):
             iter = Path('.').glob(file)
         else: